@@ -0,0 +1,288 @@
+"""
+Offline benchmark for the plugin tools.
+
+Starts bench.stub_server in a subprocess, points the shared client at it
+through AI4S_BASE_URL, and drives every tool's _invoke through a fake
+runtime. Prints (or writes) a JSON report with per-tool latency
+percentiles, throughput and allocation peaks, plus the process peak RSS
+checked against the memory limit in manifest.yaml. Exits non-zero when
+the limit is exceeded.
+
+    python -m bench.run_bench --iterations 30 --concurrency 4 --output bench.json
+"""
+# dify_plugin applies gevent monkey patching on import; it must run before
+# threading-based modules are imported, exactly as in the plugin runtime
+import dify_plugin  # noqa: F401
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# tool name -> (module, parameters)
+SCENARIOS = {
+    "semantic_search": ("tools.semantic_search", {"query": "graph neural networks", "limit": 20}),
+    "semantic_search_rerank": ("tools.semantic_search", {"query": "graph neural networks", "limit": 10, "rerank": True, "citation_weight": 0.2}),
+    "semantic_search_bulk_export": ("tools.semantic_search", {"query": "graph neural networks", "search_mode": "bulk", "limit": 3000, "sort": "citationCount:desc", "export_format": "jsonl", "output_format": "json"}),
+    "title_search": ("tools.title_search", {"title": "Attention is all you need"}),
+    "paper_detail": ("tools.paper_detail", {"paper_id": "649def34f8be52c8b66281af98ae884c09aef38b", "include_citations": True, "include_references": True}),
+    "bulk_search": ("tools.bulk_search", {"queries": "protein folding; language models; diffusion; causal inference; quantum chemistry", "limit_per_query": 10}),
+    "bulk_search_stream": ("tools.bulk_search", {"queries": "protein folding; language models; diffusion; causal inference; quantum chemistry", "limit_per_query": 10, "stream": True}),
+    "bulk_search_merge": ("tools.bulk_search", {"queries": "protein folding; language models; diffusion; causal inference; quantum chemistry", "limit_per_query": 10, "merge": True}),
+    "multiple_papers_detail": ("tools.multiple_papers_detail", {"paper_ids": ",".join(f"p{i}" for i in range(50)) + ",missing-1"}),
+    "multiple_papers_detail_stream": ("tools.multiple_papers_detail", {"paper_ids": ",".join(f"p{i}" for i in range(300)) + ",missing-1", "stream": True}),
+    "author_search": ("tools.author_search", {"query": "Chen", "limit": 10}),
+    "author_detail": ("tools.author_detail", {"author_id": "1741101"}),
+    "author_papers": ("tools.author_papers", {"author_id": "1741101", "limit": 50}),
+    "paper_recommendations": ("tools.paper_recommendations", {"paper_id": "649def34f8be52c8b66281af98ae884c09aef38b", "limit": 20}),
+    "paper_recommendations_multi": ("tools.paper_recommendations", {"positive_papers": "649def34f8be52c8b66281af98ae884c09aef38b; DOI:10.5555/stub.1; Attention is all you need", "negative_papers": "p7", "limit": 20}),
+    "paper_citations": ("tools.paper_citations", {"paper_id": "649def34f8be52c8b66281af98ae884c09aef38b", "limit": 300}),
+    "paper_references": ("tools.paper_references", {"paper_id": "649def34f8be52c8b66281af98ae884c09aef38b", "limit": 50}),
+    "citation_graph": ("tools.citation_graph", {"paper_id": "649def34f8be52c8b66281af98ae884c09aef38b", "depth": 2, "fan_out": 8, "max_nodes": 150}),
+    "author_disambiguation": ("tools.author_disambiguation", {"name": "Jane Smith", "topic": "learning", "candidates": 5}),
+}
+
+
+class MemoryStorage:
+    """
+    In-memory stand-in for the plugin storage API
+    """
+
+    def __init__(self):
+        self._data: dict[str, bytes] = {}
+
+    def set(self, key: str, val: bytes) -> None:
+        self._data[key] = val
+
+    def get(self, key: str) -> bytes:
+        return self._data[key]
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def exist(self, key: str) -> bool:
+        return key in self._data
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def memory_limit_bytes() -> int:
+    manifest = (ROOT / "manifest.yaml").read_text(encoding="utf-8")
+    match = re.search(r"^\s*memory:\s*(\d+)", manifest, re.MULTILINE)
+    return int(match.group(1)) if match else 0
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_stub(args) -> tuple[subprocess.Popen, str]:
+    command = [
+        sys.executable, "-m", "bench.stub_server",
+        "--port", "0",
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate),
+        "--throttle-rate", str(args.throttle_rate),
+        "--abstract-chars", str(args.abstract_chars),
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = process.stdout.readline().strip()
+    match = re.search(r"(http://\S+)", line)
+    if not match:
+        process.kill()
+        raise RuntimeError(f"stub server failed to start: {line!r}")
+    return process, match.group(1)
+
+
+def load_tool_class(module_name: str):
+    import importlib
+
+    from dify_plugin import Tool
+
+    module = importlib.import_module(module_name)
+    for value in vars(module).values():
+        if isinstance(value, type) and issubclass(value, Tool) and value is not Tool:
+            return value
+    raise RuntimeError(f"no Tool subclass in {module_name}")
+
+
+def make_tool(tool_class, storage):
+    from dify_plugin.entities.tool import ToolRuntime
+
+    runtime = ToolRuntime(credentials={"api_key": "bench-key"}, user_id="bench", session_id=None)
+    return tool_class(runtime=runtime, session=types.SimpleNamespace(storage=storage))
+
+
+def invoke_once(tool_class, params: dict, storage, cold: bool) -> dict:
+    from utils.cache import response_cache
+
+    if cold:
+        response_cache.clear()
+    tool = make_tool(tool_class, storage)
+    started = time.perf_counter()
+    first_message = None
+    output_bytes = 0
+    messages = 0
+    error = False
+    for message in tool._invoke(dict(params)):
+        if first_message is None:
+            first_message = time.perf_counter() - started
+        messages += 1
+        payload = message.message
+        text = getattr(payload, "text", None)
+        if text is None:
+            text = json.dumps(getattr(payload, "json_object", None) or str(payload), default=str)
+        output_bytes += len(text.encode("utf-8"))
+        if text.startswith("Error"):
+            error = True
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed": elapsed,
+        "first_message": first_message if first_message is not None else elapsed,
+        "output_bytes": output_bytes,
+        "messages": messages,
+        "error": error,
+    }
+
+
+def bench_tool(name: str, tool_class, params: dict, args, storage) -> dict:
+    # Warm-up: imports, connection pool, lazy initialisation
+    invoke_once(tool_class, params, storage, cold=True)
+
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(invoke_once, tool_class, params, storage, not args.warm)
+            for _ in range(args.iterations)
+        ]
+        results = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+
+    # Allocation pass runs separately so tracemalloc overhead does not skew latency
+    alloc_peaks = []
+    tracemalloc.start()
+    for _ in range(args.alloc_iterations):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        invoke_once(tool_class, params, storage, not args.warm)
+        alloc_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    latencies = [r["elapsed"] * 1000 for r in results]
+    first = [r["first_message"] * 1000 for r in results]
+    return {
+        "invocations": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "first_message_p50_ms": percentile(first, 50),
+        "throughput_per_s": len(results) / wall if wall else 0.0,
+        "output_bytes_mean": sum(r["output_bytes"] for r in results) / len(results) if results else 0,
+        "messages_mean": sum(r["messages"] for r in results) / len(results) if results else 0,
+        "alloc_peak_bytes": max(alloc_peaks) if alloc_peaks else 0,
+    }
+
+
+def client_stats() -> dict:
+    from utils import async_client, client
+    from utils.cache import response_cache
+    from utils.identifiers import id_index
+    from utils.metrics import registry
+    from utils.persistent_cache import persistent_cache
+
+    return {
+        "http_backend": "httpx" if async_client.async_enabled() else "requests",
+        "pool": client.get_pool_stats(),
+        "rate_limit": client.get_rate_limit_stats(),
+        "coalescing": client.get_coalescing_stats(),
+        "revalidation": client.get_revalidation_stats(),
+        "cache": response_cache.stats(),
+        "persistent_cache": persistent_cache.stats(),
+        "identifiers": id_index.stats(),
+        "metrics": registry.snapshot(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark plugin tools against a local stub API")
+    parser.add_argument("--tools", default=",".join(SCENARIOS), help="comma-separated tool names")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--alloc-iterations", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="keep the response cache between invocations")
+    parser.add_argument("--storage", action="store_true", help="give tools an in-memory plugin storage")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--abstract-chars", type=int, default=1200)
+    parser.add_argument("--rate-limit", type=float, default=1000.0, help="client token bucket rate (requests/s)")
+    parser.add_argument("--http-backend", choices=["requests", "httpx"], default="requests")
+    parser.add_argument("--no-metrics", action="store_true", help="run with instrumentation disabled")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    stub, base_url = start_stub(args)
+    try:
+        # The client reads its configuration at import time
+        os.environ["AI4S_BASE_URL"] = base_url
+        os.environ["AI4S_RATE_LIMIT"] = str(args.rate_limit)
+        os.environ["AI4S_RATE_BURST"] = str(args.rate_limit)
+        os.environ["AI4S_METRICS"] = "0" if args.no_metrics else "1"
+        os.environ["AI4S_HTTP_BACKEND"] = args.http_backend
+        sys.path.insert(0, str(ROOT))
+
+        storage = MemoryStorage() if args.storage else None
+        report_tools = {}
+        for name in [t.strip() for t in args.tools.split(",") if t.strip()]:
+            module_name, params = SCENARIOS[name]
+            report_tools[name] = bench_tool(name, load_tool_class(module_name), params, args, storage)
+            print(f"{name}: p50 {report_tools[name]['p50_ms']:.1f} ms", file=sys.stderr)
+
+        limit = memory_limit_bytes()
+        peak = peak_rss_bytes()
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "tools": report_tools,
+            "client": client_stats(),
+            "peak_rss_bytes": peak,
+            "memory_limit_bytes": limit,
+            "within_memory_limit": not limit or peak <= limit,
+        }
+    finally:
+        stub.terminate()
+        stub.wait(timeout=5)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0 if report["within_memory_limit"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Local stand-in for the ai4scholar.net API used by the benchmark harness.
+
+Serves deterministic synthetic papers and authors for the Graph and
+Recommendations endpoints the tools call, honours the `fields` projection,
+and can inject latency, 5xx errors and 429s with Retry-After.
+
+    python -m bench.stub_server --port 8765 --latency-ms 80 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 20.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 0.1,
+        abstract_chars: int = 1200,
+        authors_per_paper: int = 6,
+        total_citations: int = 2500,
+        seed: int = 7,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.abstract_chars = abstract_chars
+        self.authors_per_paper = authors_per_paper
+        self.total_citations = total_citations
+        self.seed = seed
+
+
+WORDS = (
+    "learning neural network graph protein language model attention transformer "
+    "diffusion molecular retrieval benchmark dataset clinical survey quantum "
+    "reinforcement causal inference representation vision genome"
+).split()
+
+
+def _rng(*parts) -> random.Random:
+    digest = hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+    return random.Random(int(digest[:12], 16))
+
+
+def _stable(text: str) -> int:
+    return int(hashlib.md5(text.encode()).hexdigest()[:6], 16)
+
+
+def make_author(config: StubConfig, author_id: str) -> dict:
+    rng = _rng(config.seed, "author", author_id)
+    return {
+        "authorId": author_id,
+        "name": f"{rng.choice('ABCDEFGHJKLMNPRSTW')}. {rng.choice(['Chen', 'Smith', 'Garcia', 'Kim', 'Müller', 'Rossi'])}",
+        "affiliations": [f"University {rng.randint(1, 300)}"],
+        "paperCount": rng.randint(1, 400),
+        "citationCount": rng.randint(0, 90000),
+        "hIndex": rng.randint(0, 120),
+        "homepage": f"https://example.org/~{author_id}",
+        "externalIds": {"ORCID": f"0000-0000-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"},
+    }
+
+
+def make_paper(config: StubConfig, paper_id: str) -> dict:
+    rng = _rng(config.seed, "paper", paper_id)
+    corpus_id = int(hashlib.md5(paper_id.encode()).hexdigest()[:7], 16)
+    title_words = [rng.choice(WORDS) for _ in range(rng.randint(4, 10))]
+    abstract = " ".join(rng.choice(WORDS) for _ in range(config.abstract_chars // 7))[:config.abstract_chars]
+    year = rng.randint(1995, 2025)
+    return {
+        "paperId": hashlib.sha1(paper_id.encode()).hexdigest() if ":" in paper_id else paper_id,
+        "corpusId": corpus_id,
+        "title": " ".join(title_words).capitalize(),
+        "authors": [
+            {"authorId": str(rng.randint(1, 10 ** 7)), "name": f"Author {rng.randint(1, 5000)}"}
+            for _ in range(config.authors_per_paper)
+        ],
+        "year": year,
+        "publicationDate": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "abstract": abstract,
+        # Many papers have no TL;DR; drawn separately so other fields keep their values
+        "tldr": {"model": "tldr@v2.0.0", "text": abstract[:160]} if _rng(config.seed, "tldr", paper_id).random() < 0.7 else None,
+        "citationCount": rng.randint(0, 20000),
+        "influentialCitationCount": rng.randint(0, 800),
+        "referenceCount": rng.randint(5, 120),
+        "venue": rng.choice(["NeurIPS", "Nature", "ACL", "ICML", "Cell", ""]),
+        "openAccessPdf": {"url": f"https://example.org/{corpus_id}.pdf", "status": "GREEN"} if rng.random() < 0.4 else None,
+        "externalIds": {
+            "DOI": f"10.5555/stub.{corpus_id}",
+            "ArXiv": f"{year % 100:02d}{rng.randint(1, 12):02d}.{rng.randint(10000, 99999)}",
+            "CorpusId": corpus_id,
+        },
+        "fieldsOfStudy": [rng.choice(["Computer Science", "Medicine", "Biology", "Physics"])],
+        "publicationTypes": ["JournalArticle"],
+    }
+
+
+def project(record: dict, fields: str | None) -> dict:
+    if not fields:
+        return {k: record[k] for k in ("paperId", "title") if k in record} or record
+    wanted = {f.split(".")[0] for f in fields.split(",") if f}
+    wanted.update({"paperId", "authorId"})
+    return {k: v for k, v in record.items() if k in wanted}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "ai4s-stub/1.0"
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # body waits on the client's delayed ACK (~40 ms on Linux)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self) -> StubConfig:
+        return self.server.config
+
+    def _send(self, status: int, payload, headers: dict | None = None) -> None:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self) -> bool:
+        """
+        Apply latency and fault injection; returns False if a fault was sent
+        """
+        config = self.config
+        with self.server.lock:
+            self.server.request_count += 1
+            roll = self.server.rng.random()
+            delay = max(0.0, config.latency_ms + self.server.rng.uniform(-config.jitter_ms, config.jitter_ms))
+        time.sleep(delay / 1000)
+        if roll < config.throttle_rate:
+            self._send(429, {"message": "Too Many Requests"}, {"Retry-After": str(config.retry_after)})
+            return False
+        if roll < config.throttle_rate + config.error_rate:
+            self._send(503, {"message": "Service Unavailable"})
+            return False
+        return True
+
+    def _query(self) -> tuple[str, dict]:
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        return unquote(url.path), query
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        path, query = self._query()
+        if not self._simulate():
+            return
+        config = self.config
+        fields = query.get("fields")
+        limit = int(query.get("limit", 10))
+        offset = int(query.get("offset", 0))
+
+        if path in ("/graph/v1/paper/search", "/graph/v1/paper/search/bulk"):
+            text = query.get("query", "")
+            papers = [project(make_paper(config, f"s{_stable(text)}-{offset + i}"), fields) for i in range(limit)]
+            if path.endswith("/bulk"):
+                start = int(query.get("token") or 0)
+                papers = [project(make_paper(config, f"b{_stable(text)}-{start + i}"), fields) for i in range(1000)]
+                payload = {"total": 5000, "data": papers}
+                if start + 1000 < 5000:
+                    payload["token"] = str(start + 1000)
+                return self._send(200, payload)
+            return self._send(200, {"total": 10000, "offset": offset, "next": offset + limit, "data": papers})
+
+        if path == "/graph/v1/paper/search/match":
+            paper = make_paper(config, f"m{_stable(query.get('query', ''))}")
+            paper["title"] = query.get("query", paper["title"])
+            paper["matchScore"] = 180.0
+            return self._send(200, {"data": [project(paper, fields)]})
+
+        if path == "/graph/v1/author/search":
+            authors = [project(make_author(config, str(1000 + offset + i)), fields) for i in range(limit)]
+            return self._send(200, {"total": 40, "offset": offset, "data": authors})
+
+        match = re.fullmatch(r"/graph/v1/paper/(.+)/(citations|references)", path)
+        if match:
+            paper_id, kind = match.groups()
+            key = "citingPaper" if kind == "citations" else "citedPaper"
+            total = config.total_citations if kind == "citations" else 60
+            end = min(offset + limit, total)
+            rows = [{key: project(make_paper(config, f"{kind[0]}{paper_id}-{i}"), fields)} for i in range(offset, end)]
+            payload = {"offset": offset, "data": rows}
+            if end < total:
+                payload["next"] = end
+            return self._send(200, payload)
+
+        match = re.fullmatch(r"/graph/v1/author/([^/]+)/papers", path)
+        if match:
+            papers = [project(make_paper(config, f"a{match.group(1)}-{offset + i}"), fields) for i in range(limit)]
+            return self._send(200, {"offset": offset, "next": offset + limit, "data": papers})
+
+        match = re.fullmatch(r"/graph/v1/author/([^/]+)", path)
+        if match:
+            return self._send(200, project(make_author(config, match.group(1)), fields))
+
+        match = re.fullmatch(r"/graph/v1/paper/(.+)", path)
+        if match:
+            paper_id = match.group(1)
+            if paper_id.startswith("missing"):
+                return self._send(404, {"error": "Paper not found"})
+            return self._send(200, project(make_paper(config, paper_id), fields))
+
+        match = re.fullmatch(r"/recommendations/v1/papers/forpaper/(.+)", path)
+        if match:
+            papers = [project(make_paper(config, f"r{match.group(1)}-{i}"), fields) for i in range(limit)]
+            return self._send(200, {"recommendedPapers": papers})
+
+        self._send(404, {"error": f"Unknown endpoint {path}"})
+
+    def do_POST(self):
+        path, query = self._query()
+        body = self._read_json()
+        if not self._simulate():
+            return
+        config = self.config
+        fields = query.get("fields")
+
+        if path == "/graph/v1/paper/batch":
+            ids = body.get("ids", [])
+            return self._send(200, [
+                None if paper_id.startswith("missing") else project(make_paper(config, paper_id), fields)
+                for paper_id in ids
+            ])
+
+        if path == "/graph/v1/author/batch":
+            return self._send(200, [project(make_author(config, author_id), fields) for author_id in body.get("ids", [])])
+
+        if path == "/recommendations/v1/papers":
+            limit = int(query.get("limit", 100))
+            seed = ",".join(body.get("positivePaperIds", []))
+            papers = [project(make_paper(config, f"r{_stable(seed)}-{i}"), fields) for i in range(limit)]
+            return self._send(200, {"recommendedPapers": papers})
+
+        self._send(404, {"error": f"Unknown endpoint {path}"})
+
+
+def start_server(config: StubConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config
+    server.lock = threading.Lock()
+    server.rng = random.Random(config.seed)
+    server.request_count = 0
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--abstract-chars", type=int, default=1200)
+    parser.add_argument("--authors-per-paper", type=int, default=6)
+    parser.add_argument("--total-citations", type=int, default=2500)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        abstract_chars=args.abstract_chars,
+        authors_per_paper=args.authors_per_paper,
+        total_citations=args.total_citations,
+    )
+    server = start_server(config, args.host, args.port)
+    print(f"stub listening on http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import hmac
+from typing import Mapping
+
+from werkzeug import Request, Response
+from dify_plugin import Endpoint
+
+from utils.cache import response_cache
+from utils.client import get_coalescing_stats, get_pool_stats, get_rate_limit_stats, get_revalidation_stats
+from utils.metrics import METRICS_ENABLED, registry
+from utils.persistent_cache import persistent_cache
+
+
+class MetricsEndpoint(Endpoint):
+    """
+    Prometheus scrape target for the plugin's in-process metrics
+    """
+    
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        # The endpoint is closed until an access token is configured
+        token = settings.get("token") or ""
+        if not token:
+            return Response("Forbidden: set an access token for this endpoint\n", status=403, content_type="text/plain")
+        supplied = r.args.get("token", "")
+        authorization = r.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            supplied = authorization[len("Bearer "):]
+        if not hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8")):
+            return Response("Unauthorized\n", status=401, content_type="text/plain")
+        
+        # Point-in-time values are gauges; counts that only grow are
+        # counters, named with a _total suffix
+        gauges = {"ai4s_metrics_enabled": int(METRICS_ENABLED)}
+        totals = {}
+        
+        cache = response_cache.stats()
+        gauges["ai4s_cache_entries"] = cache["entries"]
+        totals["ai4s_cache_hits_total"] = cache["hits"]
+        totals["ai4s_cache_misses_total"] = cache["misses"]
+        totals["ai4s_cache_stale_hits_total"] = cache["stale_hits"]
+        
+        storage = persistent_cache.stats()
+        gauges["ai4s_storage_cache_bytes"] = storage["bytes"]
+        totals["ai4s_storage_cache_hits_total"] = storage["hits"]
+        
+        pool = get_pool_stats()
+        totals["ai4s_pool_requests_total"] = pool["requests"]
+        totals["ai4s_pool_connections_opened_total"] = pool["connections_opened"]
+        
+        rate = get_rate_limit_stats()
+        gauges["ai4s_rate_limit_rate"] = rate["rate"]
+        totals["ai4s_rate_limit_throttled_total"] = rate["throttled"]
+        
+        totals["ai4s_coalesced_requests_total"] = get_coalescing_stats()["coalesced"]
+        
+        revalidation = get_revalidation_stats()
+        totals["ai4s_revalidations_total"] = revalidation["refreshed"]
+        totals["ai4s_revalidation_failures_total"] = revalidation["failed"]
+        
+        return Response(
+            registry.render(gauges, totals),
+            status=200,
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -0,0 +1,52 @@
+# dify_plugin applies gevent monkey patching on import; it must run before
+# threading-based modules are imported, exactly as in the plugin runtime
+import dify_plugin  # noqa: F401
+
+import os
+import threading
+
+import pytest
+
+from bench.stub_server import StubConfig, start_server
+
+
+# The client reads AI4S_BASE_URL at import, so the stub is started before
+# any tool module is loaded
+STUB = start_server(StubConfig(latency_ms=0, jitter_ms=0))
+threading.Thread(target=STUB.serve_forever, daemon=True).start()
+os.environ["AI4S_BASE_URL"] = f"http://127.0.0.1:{STUB.server_port}"
+
+
+@pytest.fixture
+def stub():
+    """
+    The shared stub server, with the in-process response cache cleared so
+    every test sends its own requests
+    """
+    from utils.cache import response_cache
+
+    response_cache.clear()
+    return STUB
+
+
+@pytest.fixture
+def invoke():
+    """
+    invoke(module, params) runs the module's tool against the stub and
+    returns its messages
+    """
+    from bench.run_bench import load_tool_class, make_tool
+
+    def run(module: str, params: dict) -> list:
+        tool = make_tool(load_tool_class(module), None)
+        return list(tool._invoke(dict(params)))
+
+    return run
+
+
+def texts(messages: list) -> str:
+    return "\n".join(m.message.text for m in messages if hasattr(m.message, "text"))
+
+
+def json_messages(messages: list) -> list[dict]:
+    return [m.message.json_object for m in messages if hasattr(m.message, "json_object")]
@@ -0,0 +1,31 @@
+"""
+Bulk Search against the stub server
+"""
+import pytest
+import requests
+
+import utils.client
+from tests.conftest import texts
+
+
+MODULE = "tools.bulk_search"
+
+PATHS = [{"stream": True}, {}, {"merge": True}]
+
+
+@pytest.mark.parametrize("path", PATHS, ids=["stream", "ordered", "merge"])
+@pytest.mark.parametrize("error, message", [
+    (requests.exceptions.Timeout("Event loop did not complete the requests in time"), "Error: Request timeout. Please try again."),
+    (requests.exceptions.ConnectionError("refused"), "Error: Network error - refused"),
+])
+def test_request_errors_become_messages(stub, invoke, monkeypatch, path, error, message):
+    def fail(*args, **kwargs):
+        raise error
+        yield
+
+    # The httpx backend sends uncached queries through request_many, which
+    # raises rather than yielding per-request errors when the loop stalls
+    monkeypatch.setattr(utils.client.async_client, "async_enabled", lambda: True)
+    monkeypatch.setattr(utils.client, "request_many", fail)
+    messages = invoke(MODULE, {"queries": "protein folding; diffusion", "output_format": "markdown", **path})
+    assert message in texts(messages)
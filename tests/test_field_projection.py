@@ -0,0 +1,136 @@
+"""
+Every field a tool asks the API for should show up in its Markdown output.
+The stub returns exactly the requested fields, so a field whose values
+never appear in the message text was requested and not rendered.
+"""
+import sys
+
+import pytest
+
+import utils.client
+from tests.conftest import texts
+from utils.identifiers import id_index
+
+
+# Identifiers the API returns whatever the projection
+ALWAYS_RETURNED = {"paperId", "authorId"}
+
+# Long text may be shortened to 200 characters when rendered, and the stub's
+# TL;DR repeats the first 160 characters of the abstract, so long text is
+# looked for by the characters between the two
+WINDOW = slice(160, 200)
+
+# Fields some formatters render as a marker rather than by value
+MARKERS = {"openAccessPdf": "📄"}
+
+
+def collect(value, log: list) -> None:
+    """
+    Append every paper or author record found in a parsed payload to log
+    """
+    if isinstance(value, list):
+        for item in value:
+            collect(item, log)
+    elif isinstance(value, dict):
+        if ALWAYS_RETURNED & value.keys():
+            log.append(value)
+        for item in value.values():
+            collect(item, log)
+
+
+def rendered_forms(value) -> list[str]:
+    """
+    Strings that show a field value was rendered; empty when the value
+    is empty, so there is nothing to look for
+    """
+    if value is None or isinstance(value, bool):
+        return []
+    if isinstance(value, (int, float)):
+        return [str(value)]
+    if isinstance(value, str):
+        return [value[WINDOW] if len(value) > WINDOW.stop else value] if value else []
+    if isinstance(value, list):
+        return [form for item in value for form in rendered_forms(item)]
+    if isinstance(value, dict):
+        # Nested author, TL;DR and PDF objects show their name, text or url
+        for key in ("name", "text", "url"):
+            if value.get(key):
+                return rendered_forms(value[key])
+        return [form for item in value.values() for form in rendered_forms(item)]
+    return []
+
+
+@pytest.fixture
+def records(monkeypatch):
+    """
+    Log every record of every parsed API payload. The identifier index
+    reads externalIds for its own bookkeeping, not for output, so it is
+    switched off here.
+    """
+    log: list[dict] = []
+    parse_json = utils.client.parse_json
+
+    def logged(response, path):
+        payload = parse_json(response, path)
+        collect(payload, log)
+        return payload
+
+    # Tools that import parse_json directly hold their own reference to it
+    for name, module in list(sys.modules.items()):
+        if name.split(".")[0] in ("utils", "tools") and hasattr(module, "parse_json"):
+            monkeypatch.setattr(module, "parse_json", logged)
+    monkeypatch.setattr(id_index, "learn_payload", lambda payload, depth=0: None)
+    return log
+
+
+def unrendered(log: list, text: str) -> set[str]:
+    """
+    Requested fields none of whose values appear in text
+    """
+    forms: dict[str, list[str]] = {}
+    for record in log:
+        for field, value in record.items():
+            values = rendered_forms(value)
+            if values and field in MARKERS:
+                values.append(MARKERS[field])
+            forms.setdefault(field, []).extend(values)
+    return {
+        field for field, values in forms.items()
+        if field not in ALWAYS_RETURNED and values and not any(form in text for form in values)
+    }
+
+
+PAPER_ID = "649def34f8be52c8b66281af98ae884c09aef38b"
+
+SCENARIOS = [
+    ("tools.semantic_search", {"query": "graph neural networks", "detail_level": "compact"}),
+    ("tools.semantic_search", {"query": "graph neural networks", "detail_level": "standard"}),
+    ("tools.semantic_search", {"query": "graph neural networks", "detail_level": "full"}),
+    ("tools.semantic_search", {"query": "graph neural networks", "search_mode": "bulk", "limit": 50}),
+    ("tools.title_search", {"title": "Attention is all you need"}),
+    ("tools.bulk_search", {"queries": "protein folding; diffusion"}),
+    ("tools.paper_detail", {"paper_id": PAPER_ID, "detail_level": "compact"}),
+    ("tools.paper_detail", {"paper_id": PAPER_ID, "detail_level": "standard", "include_citations": True, "include_references": True}),
+    ("tools.paper_detail", {"paper_id": PAPER_ID, "detail_level": "full"}),
+    ("tools.multiple_papers_detail", {"paper_ids": "p1,p2,missing-1", "detail_level": "compact"}),
+    ("tools.multiple_papers_detail", {"paper_ids": "p1,p2,missing-1", "detail_level": "standard"}),
+    ("tools.multiple_papers_detail", {"paper_ids": "p1,p2,missing-1", "detail_level": "full"}),
+    ("tools.paper_recommendations", {"paper_id": PAPER_ID}),
+    ("tools.paper_citations", {"paper_id": PAPER_ID, "limit": 30}),
+    ("tools.paper_references", {"paper_id": PAPER_ID, "limit": 30}),
+    ("tools.citation_graph", {"paper_id": PAPER_ID}),
+    ("tools.author_search", {"query": "Chen"}),
+    ("tools.author_detail", {"author_id": "1741101"}),
+    ("tools.author_papers", {"author_id": "1741101"}),
+    ("tools.author_disambiguation", {"name": "Chen", "topic": "graph"}),
+]
+
+
+@pytest.mark.parametrize(
+    "module, params", SCENARIOS, ids=[f"{m.split('.')[-1]}-{i}" for i, (m, _) in enumerate(SCENARIOS)]
+)
+def test_requested_fields_are_rendered(stub, invoke, records, module, params):
+    messages = invoke(module, {**params, "output_format": "markdown"})
+    assert messages
+    assert records, "the tool made no API request"
+    assert unrendered(records, texts(messages)) == set()
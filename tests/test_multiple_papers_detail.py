@@ -0,0 +1,71 @@
+"""
+Multiple Papers Detail against the stub server, which answers the batch
+endpoint with null for IDs starting with "missing"
+"""
+import requests
+
+import utils.client
+from tests.conftest import json_messages, texts
+
+
+MODULE = "tools.multiple_papers_detail"
+
+
+def test_null_entries_are_reported_as_not_found(stub, invoke):
+    messages = invoke(MODULE, {"paper_ids": "p1, missing-1\np2", "output_format": "both"})
+
+    records = json_messages(messages)[0]["papers"]
+    assert [r["requested_id"] for r in records] == ["p1", "missing-1", "p2"]
+    assert records[1] == {"requested_id": "missing-1", "error": "Not Found"}
+    assert records[0]["paper_id"] == "p1" and records[2]["paper_id"] == "p2"
+
+    markdown = texts(messages)
+    assert "## Paper 2: Not Found\nID: missing-1" in markdown
+    assert "**Requesting:** 3 papers" in markdown
+
+
+def test_more_than_twenty_ids_take_one_request(stub, invoke):
+    ids = [f"many-{i}" for i in range(120)]
+    before = stub.request_count
+    messages = invoke(MODULE, {"paper_ids": ",".join(ids), "output_format": "json"})
+
+    records = json_messages(messages)[0]["papers"]
+    assert [r["paper_id"] for r in records] == ids
+    assert stub.request_count - before == 1
+
+
+def test_ids_past_the_batch_limit_are_dropped(stub, invoke):
+    ids = [f"limit-{i}" for i in range(utils.client.BATCH_LIMIT + 20)]
+    before = stub.request_count
+    messages = invoke(MODULE, {"paper_ids": "\n".join(ids), "output_format": "json"})
+
+    records = json_messages(messages)[0]["papers"]
+    assert len(records) == utils.client.BATCH_LIMIT
+    assert stub.request_count - before == 1
+
+
+def test_streaming_sends_one_request_per_chunk(stub, invoke):
+    ids = [f"stream-{i}" for i in range(250)] + ["missing-2"]
+    before = stub.request_count
+    messages = invoke(MODULE, {"paper_ids": ",".join(ids), "stream": True, "output_format": "json"})
+
+    records = {r["index"]: r for r in json_messages(messages)}
+    assert sorted(records) == list(range(1, len(ids) + 1))
+    assert records[len(ids)]["error"] == "Not Found"
+    assert stub.request_count - before == 3
+
+    # A second call is served from the cache
+    before = stub.request_count
+    invoke(MODULE, {"paper_ids": ",".join(ids[:250]), "stream": True, "output_format": "json"})
+    assert stub.request_count == before
+
+
+def test_request_errors_become_messages(stub, invoke, monkeypatch):
+    def timeout(*args, **kwargs):
+        raise requests.exceptions.Timeout("Event loop did not complete the requests in time")
+        yield
+
+    monkeypatch.setattr(utils.client, "request_many", timeout)
+    for stream in (False, True):
+        messages = invoke(MODULE, {"paper_ids": "p1,p2", "stream": stream, "output_format": "markdown"})
+        assert "Error: Request timeout. Please try again." in texts(messages)
@@ -0,0 +1,35 @@
+"""
+Paper Recommendations against the stub server
+"""
+from tests.conftest import json_messages, texts
+
+
+MODULE = "tools.paper_recommendations"
+
+
+def seeds(tag: str) -> dict:
+    # Fresh DOIs per test: the identifier index remembers resolved ones
+    return {
+        "positive_papers": f"DOI:10.5555/{tag}.1\nAttention is all you need",
+        "negative_papers": f"DOI:10.5555/{tag}.2",
+    }
+
+
+def test_seeds_are_resolved_and_posted(stub, invoke):
+    before = stub.request_count
+    messages = invoke(MODULE, {**seeds("resolved"), "output_format": "json"})
+
+    payload = json_messages(messages)[0]
+    assert len(payload["positive_paper_ids"]) == 2
+    assert payload["papers"]
+    assert "truncated" not in payload
+    # One batch ID lookup, one title match and the recommendations POST
+    assert stub.request_count - before == 3
+
+
+def test_request_budget_stops_before_the_post(stub, invoke):
+    before = stub.request_count
+    messages = invoke(MODULE, {**seeds("budget"), "max_requests": 2, "output_format": "markdown"})
+
+    assert texts(messages) == "Error: Invocation request budget reached before recommendations were fetched"
+    assert stub.request_count - before == 2
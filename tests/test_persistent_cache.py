@@ -0,0 +1,104 @@
+"""
+Write-behind storage writes are drained before an invocation ends
+"""
+import threading
+import time
+
+from utils.persistent_cache import INDEX_KEY, PersistentCache, decode, encode, storage_key
+
+
+class SlowStorage:
+    """
+    In-memory stand-in for the plugin storage API that takes delay
+    seconds per write and records writes made after close()
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.data: dict[str, bytes] = {}
+        self.closed = False
+        self.late_writes = 0
+        self.lock = threading.Lock()
+
+    def set(self, key: str, value: bytes) -> None:
+        time.sleep(self.delay)
+        with self.lock:
+            if self.closed:
+                self.late_writes += 1
+            self.data[key] = value
+
+    def get(self, key: str) -> bytes:
+        return self.data[key]
+
+    def exist(self, key: str) -> bool:
+        return key in self.data
+
+    def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+
+def test_drain_waits_for_queued_writes():
+    cache = PersistentCache(1024 * 1024)
+    storage = SlowStorage(delay=0.01)
+    for i in range(5):
+        cache.put(storage, ("paper", str(i)), {"paperId": str(i)}, ttl=60)
+
+    cache.drain(storage, timeout=5)
+    storage.closed = True
+
+    assert all(storage_key(("paper", str(i))) in storage.data for i in range(5))
+    assert decode(storage.data[storage_key(("paper", "3"))])["v"] == {"paperId": "3"}
+    assert cache.stats()["pending_writes"] == 0
+    time.sleep(0.05)
+    assert storage.late_writes == 0
+
+
+def test_writes_left_after_the_timeout_are_dropped():
+    cache = PersistentCache(1024 * 1024)
+    storage = SlowStorage(delay=0.05)
+    for i in range(20):
+        cache.put(storage, ("paper", str(i)), {"paperId": str(i)}, ttl=60)
+
+    cache.drain(storage, timeout=0.1)
+    storage.closed = True
+    cache.flush(timeout=5)
+
+    # At most the write in progress when the timeout hit lands late
+    assert storage.late_writes <= 1
+    assert cache.stats()["dropped_writes"] > 0
+
+
+
+def test_each_tenant_storage_has_its_own_index():
+    tenant_a, tenant_b = SlowStorage(), SlowStorage()
+    first = PersistentCache(1024 * 1024)
+    first.put(tenant_a, ("paper", "a"), {"paperId": "a"}, ttl=60)
+    first.put(tenant_b, ("paper", "b"), {"paperId": "b"}, ttl=60)
+    first.drain(tenant_a, timeout=5)
+    first.drain(tenant_b, timeout=5)
+
+    # Each tenant's stored index lists only its own keys
+    assert set(decode(tenant_a.data[INDEX_KEY])) == {storage_key(("paper", "a"))}
+    assert set(decode(tenant_b.data[INDEX_KEY])) == {storage_key(("paper", "b"))}
+
+    # A restarted process that serves tenant A first still finds B's entries
+    restarted = PersistentCache(1024 * 1024)
+    assert restarted.get(tenant_a, ("paper", "b")) is None
+    assert restarted.get(tenant_a, ("paper", "a"))[0] == {"paperId": "a"}
+    assert restarted.get(tenant_b, ("paper", "b"))[0] == {"paperId": "b"}
+    assert restarted.stats()["tenants"] == 2
+
+
+def test_budget_is_kept_per_tenant():
+    blob_size = len(encode({"e": time.time() + 60, "s": time.time() + 60, "v": "x" * 50}))
+    cache = PersistentCache(blob_size * 3 + 8)
+    tenant_a, tenant_b = SlowStorage(), SlowStorage()
+    for i in range(3):
+        cache.put(tenant_a, ("paper", f"a{i}"), "x" * 50, ttl=60)
+        cache.put(tenant_b, ("paper", f"b{i}"), "x" * 50, ttl=60)
+    cache.drain(tenant_a, timeout=5)
+    cache.drain(tenant_b, timeout=5)
+
+    # Six entries fit: three per tenant, each within its own budget
+    assert cache.stats()["evictions"] == 0
+    assert cache.stats()["entries"] == 6
@@ -0,0 +1,37 @@
+"""
+Stale search results are refreshed in the background without touching
+the session storage of the invocation that served them
+"""
+import time
+
+from bench.run_bench import load_tool_class, make_tool
+from tests.test_persistent_cache import SlowStorage
+from utils.cache import response_cache
+from utils.persistent_cache import persistent_cache
+from utils.revalidation import revalidator
+
+
+def make_stale() -> None:
+    with response_cache._lock:
+        for key, (fresh_until, keep_until, value) in response_cache._data.items():
+            response_cache._data[key] = (time.monotonic() - 1, keep_until, value)
+
+
+def test_background_refresh_leaves_session_storage_alone(stub, invoke):
+    params = {"query": "stale graph search", "output_format": "json"}
+    invoke("tools.semantic_search", params)
+    make_stale()
+
+    storage = SlowStorage()
+    refreshed = revalidator.stats()["refreshed"]
+    tool = make_tool(load_tool_class("tools.semantic_search"), storage)
+    assert list(tool._invoke(dict(params)))
+    storage.closed = True
+
+    deadline = time.monotonic() + 5
+    while revalidator.stats()["refreshed"] == refreshed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    persistent_cache.flush(timeout=5)
+
+    assert revalidator.stats()["refreshed"] == refreshed + 1
+    assert storage.late_writes == 0
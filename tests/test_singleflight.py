@@ -0,0 +1,100 @@
+"""
+Coalesced calls keep each invocation's budget to itself
+"""
+import threading
+import time
+
+import pytest
+import requests
+
+from utils.budget import BudgetExhausted, InvocationBudget, _current
+from utils.singleflight import SingleFlight
+
+
+def run_in_thread(target, budget=None) -> dict:
+    outcome: dict = {}
+
+    def run():
+        if budget is not None:
+            _current.set(budget)
+        try:
+            outcome["result"] = target()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    outcome["thread"] = thread
+    return outcome
+
+
+def test_followers_share_the_leader_result_and_errors():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def fail():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        raise requests.exceptions.ConnectionError("refused")
+
+    leader = run_in_thread(lambda: flight.do("k", fail))
+    started.wait()
+    follower = run_in_thread(lambda: flight.do("k", fail))
+    leader["thread"].join()
+    follower["thread"].join()
+
+    assert len(calls) == 1
+    assert isinstance(follower["error"], requests.exceptions.ConnectionError)
+    assert flight.stats()["coalesced"] == 1
+
+
+def test_follower_retries_after_the_leader_budget_ran_out():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            time.sleep(0.1)
+            raise BudgetExhausted("Invocation deadline reached")
+        return "payload"
+
+    leader = run_in_thread(lambda: flight.do("k", fetch), InvocationBudget(deadline_seconds=0.05))
+    started.wait()
+    follower = run_in_thread(lambda: flight.do("k", fetch))
+    leader["thread"].join()
+    follower["thread"].join()
+
+    assert isinstance(leader["error"], BudgetExhausted)
+    assert follower["result"] == "payload"
+    assert len(calls) == 2
+
+
+def test_follower_wait_is_bounded_by_its_deadline():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "payload"
+
+    leader = run_in_thread(lambda: flight.do("k", slow))
+    started.wait()
+    budget = InvocationBudget(deadline_seconds=0.1)
+    began = time.monotonic()
+    follower = run_in_thread(lambda: flight.do("k", slow), budget)
+    follower["thread"].join(2)
+    waited = time.monotonic() - began
+    release.set()
+    leader["thread"].join()
+
+    assert isinstance(follower["error"], BudgetExhausted)
+    assert budget.truncated == "deadline"
+    assert waited == pytest.approx(0.1, abs=0.5)
+    assert leader["result"] == "payload"
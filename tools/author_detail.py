@@ -3,14 +3,17 @@ import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.client import cached_get
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_author, wants_json, wants_markdown
+
 
 class AuthorDetailTool(Tool):
     """
     Get detailed information about a specific author
     """
     
-    BASE_URL = "https://ai4scholar.net"
-    
+    @instrumented
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -20,19 +23,23 @@ class AuthorDetailTool(Tool):
             yield self.create_text_message("Error: Author ID is required")
             return
         
+        output_format = get_output_format(tool_parameters)
+        
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
         try:
-            response = requests.get(
-                f"{self.BASE_URL}/graph/v1/author/{author_id}",
-                headers={"Authorization": f"Bearer {api_key}"},
+            response = cached_get(
+                "author",
+                author_id,
+                f"/graph/v1/author/{author_id}",
+                api_key,
                 params={
                     "fields": "authorId,name,affiliations,paperCount,citationCount,hIndex,homepage,externalIds"
                 },
-                timeout=30
+                storage=self.session.storage
             )
             
             if response.status_code == 401:
@@ -50,6 +57,11 @@ class AuthorDetailTool(Tool):
             
             author = response.json()
             
+            if wants_json(output_format):
+                yield self.create_json_message({"author": normalize_author(author)})
+            if not wants_markdown(output_format):
+                return
+            
             # Format result
             name = author.get("name", "N/A")
             affiliations = author.get("affiliations", [])
@@ -0,0 +1,276 @@
+from typing import Any, Generator, Optional
+import math
+import re
+import requests
+from dify_plugin.entities.tool import ToolInvokeMessage
+from dify_plugin import Tool
+
+from utils.budget import budgeted, truncation_reason
+from utils.client import cached_batch, cached_get
+from utils.concurrency import fan_out
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_author, normalize_paper, wants_json, wants_markdown
+
+
+def _tokens(text: str) -> list[str]:
+    return [t for t in re.split(r"[^\w]+", (text or "").lower()) if t]
+
+
+def name_match(query: str, name: str) -> float:
+    """
+    Fraction of query name tokens found in the candidate name, where a
+    single-letter token matches as an initial ("J. Smith" ~ "John Smith")
+    """
+    query_tokens = _tokens(query)
+    name_tokens = _tokens(name)
+    if not query_tokens or not name_tokens:
+        return 0.0
+    matched = 0
+    for token in query_tokens:
+        if token in name_tokens:
+            matched += 1
+        elif len(token) == 1 and any(n.startswith(token) for n in name_tokens):
+            matched += 0.8
+        elif any(len(n) == 1 and token.startswith(n) for n in name_tokens):
+            matched += 0.8
+    return matched / len(query_tokens)
+
+
+def overlap(hint: str, texts: list[str]) -> float:
+    """
+    Fraction of hint tokens appearing anywhere in texts
+    """
+    hint_tokens = set(_tokens(hint))
+    if not hint_tokens:
+        return 0.0
+    seen = set()
+    for text in texts:
+        seen.update(_tokens(text))
+    return len(hint_tokens & seen) / len(hint_tokens)
+
+
+class AuthorDisambiguationTool(Tool):
+    """
+    Search authors by name and rank candidates with their details and a sample of their papers
+    """
+    
+    SEARCH_FIELDS = "authorId,name"
+    DETAIL_FIELDS = "authorId,name,affiliations,paperCount,citationCount,hIndex,homepage,externalIds"
+    PAPER_FIELDS = "paperId,title,year,citationCount,venue"
+    
+    # The author papers endpoint has no citation ordering, so the most cited
+    # papers shown are picked from this many of each candidate's papers
+    PAPERS_SAMPLED = 20
+    
+    @instrumented
+    @budgeted
+    def _invoke(
+        self, tool_parameters: dict[str, Any]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        
+        name = tool_parameters.get("name", "").strip()
+        if not name:
+            yield self.create_text_message("Error: Author name is required")
+            return
+        
+        affiliation_hint = tool_parameters.get("affiliation", "") or ""
+        topic_hint = tool_parameters.get("topic", "") or ""
+        limit = min(max(int(tool_parameters.get("candidates", 5)), 1), 10)
+        papers_per_author = min(max(int(tool_parameters.get("papers_per_author", 3)), 1), 10)
+        
+        output_format = get_output_format(tool_parameters)
+        
+        api_key = self.runtime.credentials.get("api_key", "")
+        if not api_key:
+            yield self.create_text_message("Error: API key is required")
+            return
+        
+        storage = self.session.storage
+        
+        try:
+            response = cached_get(
+                "author_search",
+                name,
+                "/graph/v1/author/search",
+                api_key,
+                params={"query": name, "limit": limit, "fields": self.SEARCH_FIELDS},
+                storage=storage
+            )
+            
+            if response.status_code == 401:
+                yield self.create_text_message("Error: Invalid API key")
+                return
+            elif response.status_code == 402:
+                yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+                return
+            elif response.status_code != 200:
+                yield self.create_text_message(f"Error: API returned status {response.status_code}")
+                return
+            
+            author_ids = [a.get("authorId") for a in response.json().get("data", []) if a.get("authorId")]
+            
+        except requests.exceptions.Timeout:
+            yield self.create_text_message("Error: Request timeout. Please try again.")
+            return
+        except requests.exceptions.RequestException as e:
+            yield self.create_text_message(f"Error: Network error - {str(e)}")
+            return
+        
+        if not author_ids:
+            if wants_json(output_format):
+                yield self.create_json_message({"query": name, "candidates": []})
+            if wants_markdown(output_format):
+                yield self.create_text_message(f"No authors found for: {name}")
+            return
+        
+        # Details for all candidates (one batch request) and the papers of
+        # every candidate are fetched together in a single concurrent stage
+        def fetch(author_id: Optional[str]) -> tuple[str, Any]:
+            if author_id is None:
+                batch = cached_batch(
+                    "author", "/graph/v1/author/batch", author_ids, api_key, self.DETAIL_FIELDS
+                )
+                if batch.status_code in (401, 402):
+                    return "fatal", batch.status_code
+                return "ok", batch
+            try:
+                response = cached_get(
+                    "author_papers",
+                    author_id,
+                    f"/graph/v1/author/{author_id}/papers",
+                    api_key,
+                    params={"fields": self.PAPER_FIELDS, "limit": self.PAPERS_SAMPLED},
+                    storage=storage
+                )
+                if response.status_code in (401, 402):
+                    return "fatal", response.status_code
+                elif response.status_code != 200:
+                    return "error", []
+                return "ok", response.json().get("data", [])
+            except Exception:
+                return "error", []
+        
+        details: dict[str, Any] = {}
+        papers_by_author: dict[str, list] = {}
+        fatal_status = None
+        try:
+            tasks = [None] + author_ids
+            pending = fan_out(fetch, tasks, len(tasks))
+            for index, (status, payload) in pending:
+                if status == "fatal":
+                    fatal_status = payload
+                    break
+                if tasks[index] is None:
+                    details = payload.records
+                else:
+                    papers_by_author[tasks[index]] = payload
+            pending.close()
+        except requests.exceptions.Timeout:
+            yield self.create_text_message("Error: Request timeout. Please try again.")
+            return
+        except requests.exceptions.RequestException as e:
+            yield self.create_text_message(f"Error: Network error - {str(e)}")
+            return
+        
+        if fatal_status == 401:
+            yield self.create_text_message("Error: Invalid API key")
+            return
+        elif fatal_status == 402:
+            yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+            return
+        
+        candidates = []
+        for author_id in author_ids:
+            author = details.get(author_id) or {"authorId": author_id}
+            papers = sorted(
+                papers_by_author.get(author_id, []),
+                key=lambda p: p.get("citationCount") or 0,
+                reverse=True
+            )
+            titles = [p.get("title") or "" for p in papers]
+            name_score = name_match(name, author.get("name", ""))
+            affiliation_score = overlap(affiliation_hint, author.get("affiliations") or [])
+            topic_score = overlap(topic_hint, titles)
+            impact_score = min(math.log10(1 + (author.get("citationCount") or 0)) / 5, 1.0)
+            score = 0.5 * name_score + 0.2 * affiliation_score + 0.2 * topic_score + 0.1 * impact_score
+            candidates.append({
+                "author": author,
+                "papers": papers[:papers_per_author],
+                "papers_sampled": len(papers),
+                "score": round(score, 3),
+                "signals": {
+                    "name": round(name_score, 3),
+                    "affiliation": round(affiliation_score, 3),
+                    "topic": round(topic_score, 3),
+                    "impact": round(impact_score, 3)
+                }
+            })
+        
+        candidates.sort(key=lambda c: c["score"], reverse=True)
+        truncated = truncation_reason()
+        
+        if wants_json(output_format):
+            payload = {
+                "query": name,
+                "candidates": [
+                    {
+                        **normalize_author(c["author"]),
+                        "score": c["score"],
+                        "signals": c["signals"],
+                        "papers_sampled": c["papers_sampled"],
+                        "papers": [normalize_paper(p) for p in c["papers"]]
+                    }
+                    for c in candidates
+                ]
+            }
+            if truncated:
+                payload["truncated"] = truncated
+            yield self.create_json_message(payload)
+        if not wants_markdown(output_format):
+            return
+        
+        result_lines = [f"# Author Candidates\n**Query:** \"{name}\" | **Candidates:** {len(candidates)}"]
+        hints = []
+        if affiliation_hint:
+            hints.append(f"affiliation \"{affiliation_hint}\"")
+        if topic_hint:
+            hints.append(f"topic \"{topic_hint}\"")
+        if hints:
+            result_lines.append(f"**Ranked with:** {', '.join(hints)}")
+        if truncated:
+            result_lines.append(f"_Output truncated by {truncated}: some candidates were ranked without their details or papers._")
+        
+        result_lines.append("\n| # | Name | Affiliations | Papers | Citations | h-index | Score | Author ID |")
+        result_lines.append("|---|------|--------------|--------|-----------|---------|-------|-----------|")
+        for i, c in enumerate(candidates, 1):
+            author = c["author"]
+            affiliations = ", ".join(author.get("affiliations") or []) or "N/A"
+            result_lines.append(
+                f"| {i} | {author.get('name', 'N/A')} | {affiliations.replace('|', '/')} | {author.get('paperCount', 'N/A')} "
+                f"| {author.get('citationCount', 'N/A')} | {author.get('hIndex', 'N/A')} | {c['score']:.2f} | {author.get('authorId')} |"
+            )
+        
+        for i, c in enumerate(candidates, 1):
+            author = c["author"]
+            homepage = author.get("homepage")
+            orcid = (author.get("externalIds") or {}).get("ORCID")
+            if not (c["papers"] or homepage or orcid):
+                continue
+            result_lines.append(f"\n### {i}. {author.get('name', 'N/A')}")
+            links = []
+            if homepage:
+                links.append(f"**Homepage:** {homepage}")
+            if orcid:
+                links.append(f"**ORCID:** {orcid}")
+            if links:
+                result_lines.append(" | ".join(links))
+            if not c["papers"]:
+                continue
+            result_lines.append(f"Most cited of {c['papers_sampled']} sampled papers:")
+            for paper in c["papers"]:
+                venue = f", {paper['venue']}" if paper.get("venue") else ""
+                result_lines.append(
+                    f"- {paper.get('title', 'N/A')} ({paper.get('year', 'N/A')}{venue}, {paper.get('citationCount', 0)} citations)"
+                )
+        
+        yield self.create_text_message("\n".join(result_lines))
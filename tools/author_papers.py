@@ -3,14 +3,17 @@ import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.client import cached_get
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+
 
 class AuthorPapersTool(Tool):
     """
     Get papers published by a specific author
     """
     
-    BASE_URL = "https://ai4scholar.net"
-    
+    @instrumented
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -22,20 +25,24 @@ class AuthorPapersTool(Tool):
         
         limit = min(max(int(tool_parameters.get("limit", 20)), 1), 100)
         
+        output_format = get_output_format(tool_parameters)
+        
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
         try:
-            response = requests.get(
-                f"{self.BASE_URL}/graph/v1/author/{author_id}/papers",
-                headers={"Authorization": f"Bearer {api_key}"},
+            response = cached_get(
+                "author_papers",
+                author_id,
+                f"/graph/v1/author/{author_id}/papers",
+                api_key,
                 params={
                     "fields": "paperId,title,year,citationCount,venue,openAccessPdf",
                     "limit": limit
                 },
-                timeout=30
+                storage=self.session.storage
             )
             
             if response.status_code == 401:
@@ -54,6 +61,14 @@ class AuthorPapersTool(Tool):
             data = response.json()
             papers = data.get("data", [])
             
+            if wants_json(output_format):
+                yield self.create_json_message({
+                    "author_id": author_id,
+                    "papers": [normalize_paper(p) for p in papers]
+                })
+            if not wants_markdown(output_format):
+                return
+            
             if not papers:
                 yield self.create_text_message(f"No papers found for author ID: {author_id}")
                 return
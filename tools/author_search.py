@@ -3,14 +3,17 @@ import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.client import cached_get
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_author, wants_json, wants_markdown
+
 
 class AuthorSearchTool(Tool):
     """
     Search for authors and get their publication information
     """
     
-    BASE_URL = "https://ai4scholar.net"
-    
+    @instrumented
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -22,21 +25,25 @@ class AuthorSearchTool(Tool):
         
         limit = min(max(int(tool_parameters.get("limit", 5)), 1), 20)
         
+        output_format = get_output_format(tool_parameters)
+        
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
         try:
-            response = requests.get(
-                f"{self.BASE_URL}/graph/v1/author/search",
-                headers={"Authorization": f"Bearer {api_key}"},
+            response = cached_get(
+                "author_search",
+                query,
+                "/graph/v1/author/search",
+                api_key,
                 params={
                     "query": query,
                     "limit": limit,
                     "fields": "authorId,name,affiliations,paperCount,citationCount,hIndex"
                 },
-                timeout=30
+                storage=self.session.storage
             )
             
             if response.status_code == 401:
@@ -53,6 +60,15 @@ class AuthorSearchTool(Tool):
             authors = data.get("data", [])
             total = data.get("total", 0)
             
+            if wants_json(output_format):
+                yield self.create_json_message({
+                    "query": query,
+                    "total": total,
+                    "authors": [normalize_author(a) for a in authors]
+                })
+            if not wants_markdown(output_format):
+                return
+            
             if not authors:
                 yield self.create_text_message(f"No authors found for: {query}")
                 return
@@ -4,14 +4,20 @@ import re
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.budget import BudgetExhausted, budgeted, truncation_reason
+from utils.client import cached_get_many
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+from utils.ranking import fuse_rankings
+
 
 class BulkSearchTool(Tool):
     """
     Execute multiple search queries at once
     """
     
-    BASE_URL = "https://ai4scholar.net"
-    
+    @instrumented
+    @budgeted
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -33,71 +39,255 @@ class BulkSearchTool(Tool):
             yield self.create_text_message("Note: Limited to first 10 queries\n")
         
         limit_per_query = min(max(int(tool_parameters.get("limit_per_query", 5)), 1), 20)
+        max_concurrency = min(max(int(tool_parameters.get("max_concurrency", 5)), 1), 10)
+        
+        output_format = get_output_format(tool_parameters)
         
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
-        result_lines = [f"# Bulk Search Results\n**Queries:** {len(queries)} | **Results per query:** {limit_per_query}\n"]
+        fields = "paperId,title,authors,year,citationCount,openAccessPdf"
+        calls = [
+            (
+                "paper_search",
+                query,
+                "/graph/v1/paper/search",
+                {"query": query, "limit": limit_per_query, "fields": fields}
+            )
+            for query in queries
+        ]
         
-        for i, query in enumerate(queries, 1):
-            try:
-                response = requests.get(
-                    f"{self.BASE_URL}/graph/v1/paper/search",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    params={
-                        "query": query,
-                        "limit": limit_per_query,
-                        "fields": "paperId,title,authors,year,citationCount,openAccessPdf"
-                    },
-                    timeout=30
+        def searches():
+            # Queries run concurrently (on one event loop with the httpx
+            # backend) and arrive in completion order
+            for index, response in cached_get_many(
+                calls, api_key, storage=self.session.storage, max_concurrency=max_concurrency
+            ):
+                yield index, self._classify(response)
+        
+        # A merged list needs every query's results, so merge wins over stream
+        merge = tool_parameters.get("merge", False)
+        
+        if tool_parameters.get("stream", False) and not merge:
+            # Each query block is yielded as soon as its request completes,
+            # in completion order; the block header carries the query's
+            # position so consumers can reorder
+            if wants_markdown(output_format):
+                yield self.create_text_message(
+                    f"# Bulk Search Results\n**Queries:** {len(queries)} | **Results per query:** {limit_per_query} (streaming)\n"
                 )
-                
-                if response.status_code == 401:
-                    yield self.create_text_message("Error: Invalid API key")
-                    return
-                elif response.status_code == 402:
-                    yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+            try:
+                for index, (status, payload) in searches():
+                    if status == "fatal":
+                        yield self.create_text_message(payload)
+                        return
+                    if wants_json(output_format):
+                        yield self.create_json_message(
+                            {"index": index + 1, **self._query_record(queries[index], status, payload)}
+                        )
+                    if wants_markdown(output_format):
+                        yield self.create_text_message(
+                            "\n".join(self._format_query(index + 1, queries[index], status, payload))
+                        )
+            except requests.exceptions.Timeout:
+                yield self.create_text_message("Error: Request timeout. Please try again.")
+                return
+            except requests.exceptions.RequestException as e:
+                yield self.create_text_message(f"Error: Network error - {str(e)}")
+                return
+            truncated = truncation_reason()
+            if truncated:
+                if wants_json(output_format):
+                    yield self.create_json_message({"truncated": truncated})
+                if wants_markdown(output_format):
+                    yield self.create_text_message(self._truncation_note(truncated))
+            return
+        
+        # Queries run concurrently; results are collected by index so the
+        # output keeps the input order
+        results: list[Any] = [None] * len(queries)
+        try:
+            for index, (status, payload) in searches():
+                if status == "fatal":
+                    # Leaving the loop closes the generator and cancels pending queries
+                    yield self.create_text_message(payload)
                     return
-                elif response.status_code != 200:
-                    result_lines.append(f"\n## Query {i}: \"{query}\"")
-                    result_lines.append(f"Error: API returned status {response.status_code}")
-                    continue
-                
-                data = response.json()
-                papers = data.get("data", [])
-                total = data.get("total", 0)
-                
-                result_lines.append(f"\n## Query {i}: \"{query}\"")
-                result_lines.append(f"Found {total} papers (showing {len(papers)})\n")
-                
-                if not papers:
-                    result_lines.append("No papers found.")
+                results[index] = (status, payload)
+        except requests.exceptions.Timeout:
+            yield self.create_text_message("Error: Request timeout. Please try again.")
+            return
+        except requests.exceptions.RequestException as e:
+            yield self.create_text_message(f"Error: Network error - {str(e)}")
+            return
+        truncated = truncation_reason()
+        
+        if merge:
+            yield from self._merged_output(queries, results, limit_per_query, output_format, truncated)
+            return
+        
+        if wants_json(output_format):
+            query_results = [
+                self._query_record(query, status, payload)
+                for query, (status, payload) in zip(queries, results)
+            ]
+            payload = {"queries": query_results}
+            if truncated:
+                payload["truncated"] = truncated
+            yield self.create_json_message(payload)
+        if not wants_markdown(output_format):
+            return
+        
+        result_lines = [f"# Bulk Search Results\n**Queries:** {len(queries)} | **Results per query:** {limit_per_query}\n"]
+        
+        for i, (query, (status, payload)) in enumerate(zip(queries, results), 1):
+            result_lines.extend(self._format_query(i, query, status, payload))
+        
+        if truncated:
+            result_lines.append(self._truncation_note(truncated))
+        
+        yield self.create_text_message("\n".join(result_lines))
+    
+    def _merged_output(
+        self, queries: list[str], results: list[Any], limit_per_query: int, output_format: str, truncated: str
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        One consolidated list: papers deduplicated across queries (paperId,
+        then normalized title) and ordered by reciprocal rank fusion
+        """
+        fused = fuse_rankings([
+            payload.get("data", []) if status != "error" else None
+            for status, payload in results
+        ])
+        
+        if wants_json(output_format):
+            query_results = []
+            for query, (status, payload) in zip(queries, results):
+                if status == "error":
+                    query_results.append({"query": query, "error": payload})
                     continue
-                
-                for j, paper in enumerate(papers, 1):
-                    title = paper.get("title", "N/A")
-                    authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:2]])
-                    if len(paper.get("authors", [])) > 2:
-                        authors += " et al."
-                    year = paper.get("year", "N/A")
-                    citations = paper.get("citationCount", 0)
-                    paper_id = paper.get("paperId", "")
-                    
-                    open_access = paper.get("openAccessPdf")
-                    has_pdf = "📄" if open_access else ""
-                    
-                    result_lines.append(f"{j}. {has_pdf} **{title}**")
-                    result_lines.append(f"   {authors} ({year}) | Citations: {citations}")
-                    result_lines.append(f"   ID: {paper_id}")
-                    result_lines.append("")
-                    
-            except requests.exceptions.Timeout:
-                result_lines.append(f"\n## Query {i}: \"{query}\"")
-                result_lines.append("Error: Request timeout")
-            except Exception as e:
-                result_lines.append(f"\n## Query {i}: \"{query}\"")
-                result_lines.append(f"Error: {str(e)}")
+                record = {"query": query, "total": payload.get("total", 0)}
+                if status == "stale":
+                    record["stale"] = True
+                query_results.append(record)
+            papers = []
+            for entry in fused:
+                paper = normalize_paper(entry.paper)
+                if entry.paper_id:
+                    # The first copy seen may have lacked the paperId
+                    paper["paper_id"] = entry.paper_id
+                paper["rrf_score"] = round(entry.score, 6)
+                paper["matched_queries"] = [
+                    {"query": queries[index], "rank": rank} for index, rank in entry.matches
+                ]
+                papers.append(paper)
+            payload = {"queries": query_results, "papers": papers}
+            if truncated:
+                payload["truncated"] = truncated
+            yield self.create_json_message(payload)
+        if not wants_markdown(output_format):
+            return
+        
+        result_lines = [
+            f"# Bulk Search Results (merged)\n**Queries:** {len(queries)} | **Results per query:** {limit_per_query} | **Unique papers:** {len(fused)}\n"
+        ]
+        for i, (query, (status, payload)) in enumerate(zip(queries, results), 1):
+            if status == "error":
+                result_lines.append(f"- Q{i} \"{query}\": {payload}")
+            else:
+                stale = " (cached, updating)" if status == "stale" else ""
+                result_lines.append(f"- Q{i} \"{query}\": {payload.get('total', 0)} papers{stale}")
+        result_lines.append("")
+        
+        if not fused:
+            result_lines.append("No papers found.")
+        for j, entry in enumerate(fused, 1):
+            paper = entry.paper
+            title = paper.get("title", "N/A")
+            authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:2]])
+            if len(paper.get("authors", [])) > 2:
+                authors += " et al."
+            year = paper.get("year", "N/A")
+            citations = paper.get("citationCount", 0)
+            has_pdf = "📄" if paper.get("openAccessPdf") else ""
+            matched = ", ".join(f"Q{index + 1} (#{rank})" for index, rank in entry.matches)
+            
+            result_lines.append(f"{j}. {has_pdf} **{title}**")
+            result_lines.append(f"   {authors} ({year}) | Citations: {citations}")
+            result_lines.append(f"   Matched: {matched} | Score: {entry.score:.4f}")
+            result_lines.append(f"   ID: {entry.paper_id or ''}")
+            result_lines.append("")
+        
+        if truncated:
+            result_lines.append(self._truncation_note(truncated))
         
         yield self.create_text_message("\n".join(result_lines))
+    
+    def _classify(self, response: Any) -> tuple[str, Any]:
+        if isinstance(response, BudgetExhausted):
+            return "error", f"Error: Not searched ({response})"
+        elif isinstance(response, requests.exceptions.Timeout):
+            return "error", "Error: Request timeout"
+        elif isinstance(response, Exception):
+            return "error", f"Error: {str(response)}"
+        
+        if response.status_code == 401:
+            return "fatal", "Error: Invalid API key"
+        elif response.status_code == 402:
+            return "fatal", "Error: Insufficient credits. Please recharge at ai4scholar.net"
+        elif response.status_code != 200:
+            return "error", f"Error: API returned status {response.status_code}"
+        
+        # Cached results past their TTL are served while they are refreshed
+        return "stale" if getattr(response, "stale_for", 0) else "ok", response.json()
+    
+    def _truncation_note(self, reason: str) -> str:
+        return f"\n_Output truncated by {reason}: queries marked \"Not searched\" were skipped._"
+    
+    def _query_record(self, query: str, status: str, payload: Any) -> dict:
+        if status == "error":
+            return {"query": query, "error": payload}
+        record = {
+            "query": query,
+            "total": payload.get("total", 0),
+            "papers": [normalize_paper(p) for p in payload.get("data", [])]
+        }
+        if status == "stale":
+            record["stale"] = True
+        return record
+    
+    def _format_query(self, i: int, query: str, status: str, payload: Any) -> list[str]:
+        lines = [f"\n## Query {i}: \"{query}\""]
+        if status == "error":
+            lines.append(payload)
+            return lines
+        
+        papers = payload.get("data", [])
+        total = payload.get("total", 0)
+        
+        lines.append(f"Found {total} papers (showing {len(papers)})\n")
+        if status == "stale":
+            lines.append("_Cached result; an update is running in the background._\n")
+        
+        if not papers:
+            lines.append("No papers found.")
+            return lines
+        
+        for j, paper in enumerate(papers, 1):
+            title = paper.get("title", "N/A")
+            authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:2]])
+            if len(paper.get("authors", [])) > 2:
+                authors += " et al."
+            year = paper.get("year", "N/A")
+            citations = paper.get("citationCount", 0)
+            paper_id = paper.get("paperId", "")
+            
+            open_access = paper.get("openAccessPdf")
+            has_pdf = "📄" if open_access else ""
+            
+            lines.append(f"{j}. {has_pdf} **{title}**")
+            lines.append(f"   {authors} ({year}) | Citations: {citations}")
+            lines.append(f"   ID: {paper_id}")
+            lines.append("")
+        return lines
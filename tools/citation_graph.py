@@ -0,0 +1,206 @@
+from typing import Any, Generator
+import requests
+from dify_plugin.entities.tool import ToolInvokeMessage
+from dify_plugin import Tool
+
+from utils.budget import BudgetExhausted, budgeted, truncation_reason
+from utils.client import cached_batch, cached_get
+from utils.concurrency import fan_out
+from utils.identifiers import canonical_paper_id
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+
+
+class CitationGraphTool(Tool):
+    """
+    Expand the citation neighbourhood of a seed paper with a breadth-first crawl
+    """
+    
+    NODE_FIELDS = "paperId,title,year,citationCount"
+    
+    # Edge lines printed in Markdown; JSON output always carries every edge
+    MAX_EDGE_LINES = 200
+    
+    @instrumented
+    @budgeted
+    def _invoke(
+        self, tool_parameters: dict[str, Any]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        
+        seed_id = tool_parameters.get("paper_id", "").strip()
+        if not seed_id:
+            yield self.create_text_message("Error: Paper ID is required")
+            return
+        
+        depth = min(max(int(tool_parameters.get("depth", 2)), 1), 3)
+        direction = tool_parameters.get("direction", "both")
+        if direction not in ("references", "citations", "both"):
+            direction = "both"
+        fan_out_limit = min(max(int(tool_parameters.get("fan_out", 10)), 1), 50)
+        max_nodes = min(max(int(tool_parameters.get("max_nodes", 100)), 2), 500)
+        max_concurrency = min(max(int(tool_parameters.get("max_concurrency", 5)), 1), 10)
+        rank_by = tool_parameters.get("rank_by", "degree")
+        top_k = min(max(int(tool_parameters.get("top_k", 20)), 1), 100)
+        
+        output_format = get_output_format(tool_parameters)
+        
+        api_key = self.runtime.credentials.get("api_key", "")
+        if not api_key:
+            yield self.create_text_message("Error: API key is required")
+            return
+        
+        seed_id = canonical_paper_id(seed_id)
+        storage = self.session.storage
+        kinds = ["references", "citations"] if direction == "both" else [direction]
+        
+        def neighbours(task: tuple[str, str]) -> tuple[str, Any]:
+            paper_id, kind = task
+            try:
+                response = cached_get(
+                    f"paper_{kind}",
+                    paper_id,
+                    f"/graph/v1/paper/{paper_id}/{kind}",
+                    api_key,
+                    params={"fields": "paperId", "limit": fan_out_limit},
+                    storage=storage
+                )
+                if response.status_code == 401:
+                    return "fatal", "Error: Invalid API key"
+                elif response.status_code == 402:
+                    return "fatal", "Error: Insufficient credits. Please recharge at ai4scholar.net"
+                elif response.status_code != 200:
+                    return "error", f"API returned status {response.status_code}"
+                
+                key = "citedPaper" if kind == "references" else "citingPaper"
+                ids = [(row.get(key) or {}).get("paperId") for row in response.json().get("data", [])]
+                return "ok", [i for i in ids if i]
+            except BudgetExhausted as e:
+                return "truncated", str(e)
+            except requests.exceptions.Timeout:
+                return "error", "Request timeout"
+            except Exception as e:
+                return "error", str(e)
+        
+        # Breadth-first crawl, one level at a time; each level's neighbour
+        # lists are fetched concurrently
+        node_depth = {seed_id: 0}
+        edges: set[tuple[str, str]] = set()
+        frontier = [seed_id]
+        failed = 0
+        
+        for level in range(1, depth + 1):
+            if not frontier or len(node_depth) >= max_nodes:
+                break
+            tasks = [(paper_id, kind) for paper_id in frontier for kind in kinds]
+            next_frontier = []
+            for index, (status, payload) in fan_out(neighbours, tasks, max_concurrency):
+                if status == "fatal":
+                    yield self.create_text_message(payload)
+                    return
+                if status in ("error", "truncated"):
+                    failed += 1
+                    continue
+                
+                paper_id, kind = tasks[index]
+                for other_id in payload:
+                    if other_id == paper_id:
+                        continue
+                    if other_id not in node_depth:
+                        if len(node_depth) >= max_nodes:
+                            continue
+                        node_depth[other_id] = level
+                        next_frontier.append(other_id)
+                    # Edges always point from the citing paper to the cited one
+                    edges.add((paper_id, other_id) if kind == "references" else (other_id, paper_id))
+            # Out of budget: keep what this level found but stop expanding
+            frontier = next_frontier if not truncation_reason() else []
+        
+        # Node metadata comes from one batch lookup rather than per-node GETs
+        try:
+            batch = cached_batch(
+                "paper", "/graph/v1/paper/batch", list(node_depth), api_key, self.NODE_FIELDS
+            )
+        except requests.exceptions.Timeout:
+            yield self.create_text_message("Error: Request timeout. Please try again.")
+            return
+        except requests.exceptions.RequestException as e:
+            yield self.create_text_message(f"Error: Network error - {str(e)}")
+            return
+        
+        if batch.status_code == 401:
+            yield self.create_text_message("Error: Invalid API key")
+            return
+        elif batch.status_code == 402:
+            yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+            return
+        
+        # The seed may have been given as DOI:/arXiv:; key it by its paperId
+        canonical_seed = (batch.records.get(seed_id) or {}).get("paperId", seed_id)
+        if canonical_seed != seed_id:
+            node_depth[canonical_seed] = node_depth.pop(seed_id)
+            batch.records[canonical_seed] = batch.records.pop(seed_id)
+            edges = {
+                (canonical_seed if a == seed_id else a, canonical_seed if b == seed_id else b)
+                for a, b in edges
+            }
+            edges = {(a, b) for a, b in edges if a != b}
+        
+        degree = {paper_id: 0 for paper_id in node_depth}
+        for citing, cited in edges:
+            degree[citing] += 1
+            degree[cited] += 1
+        
+        nodes = []
+        for paper_id, node_level in node_depth.items():
+            record = normalize_paper(batch.records.get(paper_id) or {"paperId": paper_id})
+            record["paper_id"] = paper_id
+            record["depth"] = node_level
+            record["degree"] = degree[paper_id]
+            nodes.append(record)
+        
+        if rank_by == "citations":
+            nodes.sort(key=lambda n: (n.get("citation_count") or 0, n["degree"]), reverse=True)
+        else:
+            nodes.sort(key=lambda n: (n["degree"], n.get("citation_count") or 0), reverse=True)
+        
+        edge_list = sorted(edges)
+        truncated = truncation_reason()
+        
+        if wants_json(output_format):
+            payload = {
+                "seed": canonical_seed,
+                "depth": depth,
+                "nodes": nodes,
+                "edges": [list(edge) for edge in edge_list],
+                "failed_requests": failed
+            }
+            if truncated:
+                payload["truncated"] = truncated
+            yield self.create_json_message(payload)
+        if not wants_markdown(output_format):
+            return
+        
+        result_lines = [f"# Citation Graph\n**Seed:** {canonical_seed} | **Depth:** {depth} | **Nodes:** {len(nodes)} | **Edges:** {len(edge_list)}"]
+        if failed:
+            result_lines.append(f"_{failed} neighbour requests failed and were skipped._")
+        if truncated:
+            result_lines.append(f"_Output truncated by {truncated}: the crawl stopped early and some nodes may lack metadata._")
+        
+        ranking = "citation count" if rank_by == "citations" else "in-crawl degree"
+        result_lines.append(f"\n## Top {min(top_k, len(nodes))} Papers (by {ranking})")
+        result_lines.append("| # | Title | Year | Citations | Degree | Depth | Paper ID |")
+        result_lines.append("|---|-------|------|-----------|--------|-------|----------|")
+        for i, node in enumerate(nodes[:top_k], 1):
+            title = (node.get("title") or "N/A").replace("|", "\\|")
+            result_lines.append(
+                f"| {i} | {title} | {node.get('year', 'N/A')} | {node.get('citation_count', 'N/A')} "
+                f"| {node['degree']} | {node['depth']} | {node['paper_id']} |"
+            )
+        
+        result_lines.append("\n## Edges (citing -> cited)")
+        for citing, cited in edge_list[:self.MAX_EDGE_LINES]:
+            result_lines.append(f"{citing} -> {cited}")
+        if len(edge_list) > self.MAX_EDGE_LINES:
+            result_lines.append(f"... {len(edge_list) - self.MAX_EDGE_LINES} more edges (use JSON output for the full list)")
+        
+        yield self.create_text_message("\n".join(result_lines))
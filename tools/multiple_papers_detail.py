@@ -1,17 +1,34 @@
 from typing import Any, Generator
-import requests
 import re
+import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.budget import budgeted, truncation_reason
+from utils.client import BATCH_LIMIT, cached_batch, iter_batch
+from utils.fields import fields_param, get_detail_level
+from utils.identifiers import canonical_paper_id
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+
 
 class MultiplePapersDetailTool(Tool):
     """
     Get details for multiple papers at once
     """
     
-    BASE_URL = "https://ai4scholar.net"
+    # Fields rendered at each detail level (cumulative)
+    FIELD_SETS = {
+        "compact": ["paperId", "title", "year", "citationCount"],
+        "standard": ["authors", "venue", "externalIds", "tldr", "abstract", "openAccessPdf"],
+    }
     
+    # Smaller batch requests in streaming mode so the first papers arrive
+    # without waiting for the whole batch
+    STREAM_CHUNK_SIZE = 100
+    
+    @instrumented
+    @budgeted
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -28,85 +45,199 @@ class MultiplePapersDetailTool(Tool):
             yield self.create_text_message("Error: No valid paper IDs found")
             return
         
-        if len(paper_ids) > 20:
-            paper_ids = paper_ids[:20]
+        if len(paper_ids) > BATCH_LIMIT:
+            paper_ids = paper_ids[:BATCH_LIMIT]
+        
+        output_format = get_output_format(tool_parameters)
         
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
+        detail_level = get_detail_level(tool_parameters)
+        fields = fields_param(self.FIELD_SETS, detail_level)
+        
+        # Lookups use canonical IDs; output keeps the IDs as given
+        requested_ids = paper_ids
+        paper_ids = [canonical_paper_id(p) for p in requested_ids]
+        
+        if tool_parameters.get("stream", False):
+            yield from self._stream(requested_ids, paper_ids, api_key, fields, detail_level, output_format)
+            return
+        
         result_lines = [f"# Multiple Papers Detail\n**Requesting:** {len(paper_ids)} papers\n"]
         
+        # Cached papers are served locally; only the misses are batched
+        try:
+            batch = cached_batch(
+                "paper", "/graph/v1/paper/batch", paper_ids, api_key, fields
+            )
+        except requests.exceptions.Timeout:
+            yield self.create_text_message("Error: Request timeout. Please try again.")
+            return
+        except requests.exceptions.RequestException as e:
+            yield self.create_text_message(f"Error: Network error - {str(e)}")
+            return
+        
+        if batch.status_code == 401:
+            yield self.create_text_message("Error: Invalid API key")
+            return
+        elif batch.status_code == 402:
+            yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+            return
+        
+        papers = batch.records
+        failures = batch.failures
+        truncated = truncation_reason()
+        
+        if wants_json(output_format):
+            records = []
+            for requested_id, paper_id in zip(requested_ids, paper_ids):
+                records.append(self._paper_record(requested_id, paper_id, papers, failures))
+            payload = {"papers": records}
+            if truncated:
+                payload["truncated"] = truncated
+            yield self.create_json_message(payload)
+        if not wants_markdown(output_format):
+            return
+        
+        for i, (requested_id, paper_id) in enumerate(zip(requested_ids, paper_ids), 1):
+            result_lines.extend(self._paper_block(i, requested_id, paper_id, papers, failures, detail_level))
+        
+        if truncated:
+            result_lines.append(self._truncation_note(truncated, len(papers), len(paper_ids)))
+        
+        yield self.create_text_message("\n".join(result_lines))
+    
+    def _stream(
+        self,
+        requested_ids: list[str],
+        paper_ids: list[str],
+        api_key: str,
+        fields: str,
+        detail_level: str,
+        output_format: str
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        Yield one message per paper as each batch chunk resolves: cached
+        papers first, then every chunk as it returns. Blocks carry their
+        1-based position in the request so consumers can reorder them.
+        """
+        positions: dict[str, list[int]] = {}
         for i, paper_id in enumerate(paper_ids, 1):
-            try:
-                response = requests.get(
-                    f"{self.BASE_URL}/graph/v1/paper/{paper_id}",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    params={
-                        "fields": "paperId,title,authors,year,abstract,citationCount,openAccessPdf,venue,externalIds,tldr"
-                    },
-                    timeout=30
-                )
-                
-                if response.status_code == 401:
+            positions.setdefault(paper_id, []).append(i)
+        
+        if wants_markdown(output_format):
+            yield self.create_text_message(
+                f"# Multiple Papers Detail\n**Requesting:** {len(paper_ids)} papers (streaming)\n"
+            )
+        
+        found = 0
+        try:
+            for part in iter_batch(
+                "paper", "/graph/v1/paper/batch", paper_ids, api_key, fields, chunk_size=self.STREAM_CHUNK_SIZE
+            ):
+                if part.status_code == 401:
                     yield self.create_text_message("Error: Invalid API key")
                     return
-                elif response.status_code == 402:
+                elif part.status_code == 402:
                     yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
                     return
-                elif response.status_code == 404:
-                    result_lines.append(f"\n## Paper {i}: Not Found")
-                    result_lines.append(f"ID: {paper_id}")
-                    continue
-                elif response.status_code != 200:
-                    result_lines.append(f"\n## Paper {i}: Error")
-                    result_lines.append(f"API returned status {response.status_code}")
-                    continue
-                
-                paper = response.json()
-                
-                title = paper.get("title", "N/A")
-                authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:5]])
-                if len(paper.get("authors", [])) > 5:
-                    authors += " et al."
-                year = paper.get("year", "N/A")
-                citations = paper.get("citationCount", 0)
-                venue = paper.get("venue", "")
-                
-                external_ids = paper.get("externalIds", {})
-                doi = external_ids.get("DOI", "")
-                
-                tldr = paper.get("tldr", {})
-                tldr_text = tldr.get("text", "") if tldr else ""
                 
-                abstract = paper.get("abstract", "")
-                if abstract and len(abstract) > 300:
-                    abstract = abstract[:300] + "..."
-                
-                open_access = paper.get("openAccessPdf")
-                pdf_url = open_access.get("url", "") if open_access else ""
-                
-                result_lines.append(f"\n---\n## {i}. {title}")
-                result_lines.append(f"**Authors:** {authors}")
-                result_lines.append(f"**Year:** {year} | **Citations:** {citations}")
-                if venue:
-                    result_lines.append(f"**Venue:** {venue}")
-                if doi:
-                    result_lines.append(f"**DOI:** {doi}")
-                if tldr_text:
-                    result_lines.append(f"**TL;DR:** {tldr_text}")
-                elif abstract:
-                    result_lines.append(f"**Abstract:** {abstract}")
-                if pdf_url:
-                    result_lines.append(f"**PDF:** {pdf_url}")
-                result_lines.append(f"**Paper ID:** {paper.get('paperId', paper_id)}")
-                
-            except requests.exceptions.Timeout:
-                result_lines.append(f"\n## Paper {i}: Timeout")
-                result_lines.append(f"ID: {paper_id}")
-            except Exception as e:
-                result_lines.append(f"\n## Paper {i}: Error")
-                result_lines.append(f"Error: {str(e)}")
+                found += sum(len(positions[p]) for p in part.records)
+                for paper_id in part.requested:
+                    for i in positions[paper_id]:
+                        requested_id = requested_ids[i - 1]
+                        if wants_json(output_format):
+                            yield self.create_json_message(
+                                {"index": i, **self._paper_record(requested_id, paper_id, part.records, part.failures)}
+                            )
+                        if wants_markdown(output_format):
+                            yield self.create_text_message("\n".join(
+                                self._paper_block(i, requested_id, paper_id, part.records, part.failures, detail_level)
+                            ))
+        except requests.exceptions.Timeout:
+            yield self.create_text_message("Error: Request timeout. Please try again.")
+            return
+        except requests.exceptions.RequestException as e:
+            yield self.create_text_message(f"Error: Network error - {str(e)}")
+            return
         
-        yield self.create_text_message("\n".join(result_lines))
+        truncated = truncation_reason()
+        if truncated and wants_json(output_format):
+            yield self.create_json_message({"truncated": truncated})
+        if wants_markdown(output_format):
+            summary = f"\n---\n**Found:** {found} of {len(paper_ids)} papers"
+            if truncated:
+                summary += "\n" + self._truncation_note(truncated, found, len(paper_ids))
+            yield self.create_text_message(summary)
+    
+    def _truncation_note(self, reason: str, found: int, requested: int) -> str:
+        return f"_Output truncated by {reason}: {found} of {requested} papers were fetched before it was reached._"
+    
+    def _paper_record(self, requested_id: str, paper_id: str, papers: dict, failures: dict) -> dict:
+        if paper_id in papers:
+            return {"requested_id": requested_id, **normalize_paper(papers[paper_id])}
+        label = failures[paper_id][0] if paper_id in failures else "Not Found"
+        return {"requested_id": requested_id, "error": label}
+    
+    def _paper_block(
+        self, i: int, requested_id: str, paper_id: str, papers: dict, failures: dict, detail_level: str
+    ) -> list[str]:
+        if paper_id in papers:
+            return self._format_paper(i, paper_id, papers[paper_id], detail_level)
+        elif paper_id in failures:
+            label, detail = failures[paper_id]
+            return [f"\n## Paper {i}: {label}", detail]
+        return [f"\n## Paper {i}: Not Found", f"ID: {requested_id}"]
+    
+    def _format_paper(self, i: int, paper_id: str, paper: dict, detail_level: str) -> list[str]:
+        title = paper.get("title", "N/A")
+        year = paper.get("year", "N/A")
+        citations = paper.get("citationCount", 0)
+        
+        lines = [f"\n---\n## {i}. {title}"]
+        
+        if detail_level == "compact":
+            lines.append(f"**Year:** {year} | **Citations:** {citations}")
+            lines.append(f"**Paper ID:** {paper.get('paperId', paper_id)}")
+            return lines
+        
+        authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:5]])
+        if len(paper.get("authors", [])) > 5:
+            authors += " et al."
+        venue = paper.get("venue", "")
+        
+        external_ids = paper.get("externalIds") or {}
+        doi = external_ids.get("DOI", "")
+        
+        tldr = paper.get("tldr", {})
+        tldr_text = tldr.get("text", "") if tldr else ""
+        
+        # "standard" shows the TL;DR, or a shortened abstract when there is
+        # none; "full" shows the whole abstract as well
+        abstract = paper.get("abstract", "")
+        if detail_level != "full":
+            if tldr_text:
+                abstract = ""
+            elif abstract and len(abstract) > 300:
+                abstract = abstract[:300] + "..."
+        
+        open_access = paper.get("openAccessPdf")
+        pdf_url = open_access.get("url", "") if open_access else ""
+        
+        lines.append(f"**Authors:** {authors}")
+        lines.append(f"**Year:** {year} | **Citations:** {citations}")
+        if venue:
+            lines.append(f"**Venue:** {venue}")
+        if doi:
+            lines.append(f"**DOI:** {doi}")
+        if tldr_text:
+            lines.append(f"**TL;DR:** {tldr_text}")
+        if abstract:
+            lines.append(f"**Abstract:** {abstract}")
+        if pdf_url:
+            lines.append(f"**PDF:** {pdf_url}")
+        lines.append(f"**Paper ID:** {paper.get('paperId', paper_id)}")
+        return lines
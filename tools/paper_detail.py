@@ -3,14 +3,29 @@ import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.client import cached_get
+from utils.fields import get_detail_level, resolve_fields
+from utils.identifiers import canonical_paper_id
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+
 
 class PaperDetailTool(Tool):
     """
     Get detailed information about a specific paper
     """
     
-    BASE_URL = "https://ai4scholar.net"
+    # Fields rendered at each detail level (cumulative)
+    FIELD_SETS = {
+        "compact": ["paperId", "title", "year", "citationCount", "referenceCount", "tldr"],
+        "standard": [
+            "authors", "abstract", "openAccessPdf", "venue",
+            "externalIds", "fieldsOfStudy", "publicationTypes"
+        ],
+        "full": ["publicationDate", "influentialCitationCount"],
+    }
     
+    @instrumented
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -23,36 +38,44 @@ class PaperDetailTool(Tool):
         include_citations = tool_parameters.get("include_citations", False)
         include_references = tool_parameters.get("include_references", False)
         
+        output_format = get_output_format(tool_parameters)
+        
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
+        # DOIs, arXiv IDs and URLs the index has seen resolve to their
+        # paperId locally, so every spelling shares one cache entry
+        paper_id = canonical_paper_id(paper_id)
+        
+        detail_level = get_detail_level(tool_parameters)
+        full = detail_level == "full"
+        
         # Build fields parameter
-        fields = [
-            "paperId", "title", "authors", "year", "abstract",
-            "citationCount", "referenceCount", "openAccessPdf",
-            "venue", "publicationDate", "externalIds", "tldr",
-            "fieldsOfStudy", "publicationTypes"
-        ]
+        fields = resolve_fields(self.FIELD_SETS, detail_level)
         
         if include_citations:
-            fields.append("citations.paperId")
+            if full:
+                fields.append("citations.paperId")
             fields.append("citations.title")
             fields.append("citations.year")
             fields.append("citations.citationCount")
         
         if include_references:
-            fields.append("references.paperId")
+            if full:
+                fields.append("references.paperId")
             fields.append("references.title")
             fields.append("references.year")
         
         try:
-            response = requests.get(
-                f"{self.BASE_URL}/graph/v1/paper/{paper_id}",
-                headers={"Authorization": f"Bearer {api_key}"},
+            response = cached_get(
+                "paper",
+                paper_id,
+                f"/graph/v1/paper/{paper_id}",
+                api_key,
                 params={"fields": ",".join(fields)},
-                timeout=30
+                storage=self.session.storage
             )
             
             if response.status_code == 401:
@@ -70,51 +93,74 @@ class PaperDetailTool(Tool):
             
             paper = response.json()
             
+            if wants_json(output_format):
+                result = {"paper": normalize_paper(paper)}
+                if include_citations:
+                    result["citations"] = [normalize_paper(c) for c in paper.get("citations") or []]
+                if include_references:
+                    result["references"] = [normalize_paper(r) for r in paper.get("references") or []]
+                yield self.create_json_message(result)
+            if not wants_markdown(output_format):
+                return
+            
             # Format result
             title = paper.get("title", "N/A")
-            authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])])
             year = paper.get("year", "N/A")
             citations = paper.get("citationCount", 0)
             ref_count = paper.get("referenceCount", 0)
-            venue = paper.get("venue", "")
-            abstract = paper.get("abstract", "")
-            
-            external_ids = paper.get("externalIds", {})
-            doi = external_ids.get("DOI", "")
-            arxiv = external_ids.get("ArXiv", "")
             
             tldr = paper.get("tldr", {})
             tldr_text = tldr.get("text", "") if tldr else ""
             
-            fields_of_study = paper.get("fieldsOfStudy", [])
-            pub_types = paper.get("publicationTypes", [])
-            
-            open_access = paper.get("openAccessPdf")
-            pdf_url = open_access.get("url", "") if open_access else ""
-            
             result_lines = [f"# {title}"]
-            result_lines.append(f"\n**Authors:** {authors}")
-            result_lines.append(f"**Year:** {year} | **Citations:** {citations} | **References:** {ref_count}")
             
-            if venue:
-                result_lines.append(f"**Venue:** {venue}")
-            if fields_of_study:
-                result_lines.append(f"**Fields:** {', '.join(fields_of_study)}")
-            if pub_types:
-                result_lines.append(f"**Type:** {', '.join(pub_types)}")
-            if doi:
-                result_lines.append(f"**DOI:** {doi}")
-            if arxiv:
-                result_lines.append(f"**arXiv:** {arxiv}")
+            if detail_level == "compact":
+                result_lines.append(f"\n**Year:** {year} | **Citations:** {citations} | **References:** {ref_count}")
+            else:
+                authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])])
+                venue = paper.get("venue", "")
+                
+                external_ids = paper.get("externalIds") or {}
+                doi = external_ids.get("DOI", "")
+                arxiv = external_ids.get("ArXiv", "")
+                
+                fields_of_study = paper.get("fieldsOfStudy") or []
+                pub_types = paper.get("publicationTypes") or []
+                
+                result_lines.append(f"\n**Authors:** {authors}")
+                result_lines.append(f"**Year:** {year} | **Citations:** {citations} | **References:** {ref_count}")
+                
+                if full:
+                    influential = paper.get("influentialCitationCount")
+                    publication_date = paper.get("publicationDate", "")
+                    if influential is not None:
+                        result_lines.append(f"**Influential Citations:** {influential}")
+                    if publication_date:
+                        result_lines.append(f"**Published:** {publication_date}")
+                if venue:
+                    result_lines.append(f"**Venue:** {venue}")
+                if fields_of_study:
+                    result_lines.append(f"**Fields:** {', '.join(fields_of_study)}")
+                if pub_types:
+                    result_lines.append(f"**Type:** {', '.join(pub_types)}")
+                if doi:
+                    result_lines.append(f"**DOI:** {doi}")
+                if arxiv:
+                    result_lines.append(f"**arXiv:** {arxiv}")
             
             if tldr_text:
                 result_lines.append(f"\n**TL;DR:** {tldr_text}")
             
-            if abstract:
-                result_lines.append(f"\n**Abstract:**\n{abstract}")
-            
-            if pdf_url:
-                result_lines.append(f"\n**Open Access PDF:** {pdf_url}")
+            if detail_level != "compact":
+                abstract = paper.get("abstract", "")
+                open_access = paper.get("openAccessPdf")
+                pdf_url = open_access.get("url", "") if open_access else ""
+                
+                if abstract:
+                    result_lines.append(f"\n**Abstract:**\n{abstract}")
+                
+                if pdf_url:
+                    result_lines.append(f"\n**Open Access PDF:** {pdf_url}")
             
             result_lines.append(f"\n**Paper ID:** {paper.get('paperId', paper_id)}")
             
@@ -127,7 +173,10 @@ class PaperDetailTool(Tool):
                         c_title = c.get("title", "N/A")
                         c_year = c.get("year", "N/A")
                         c_cites = c.get("citationCount", 0)
-                        result_lines.append(f"- {c_title} ({c_year}, {c_cites} citations)")
+                        c_line = f"- {c_title} ({c_year}, {c_cites} citations)"
+                        if full and c.get("paperId"):
+                            c_line += f" — ID: {c['paperId']}"
+                        result_lines.append(c_line)
             
             # References
             if include_references:
@@ -137,7 +186,10 @@ class PaperDetailTool(Tool):
                     for r in references_list[:10]:
                         r_title = r.get("title", "N/A")
                         r_year = r.get("year", "N/A")
-                        result_lines.append(f"- {r_title} ({r_year})")
+                        r_line = f"- {r_title} ({r_year})"
+                        if full and r.get("paperId"):
+                            r_line += f" — ID: {r['paperId']}"
+                        result_lines.append(r_line)
             
             yield self.create_text_message("\n".join(result_lines))
             
@@ -1,43 +1,107 @@
-from typing import Any, Generator
+from typing import Any, Generator, Optional
 import requests
+import re
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.budget import BudgetExhausted, budgeted, truncation_reason
+from utils.client import cached_batch, cached_get, cached_get_many, cached_post
+from utils.identifiers import canonical_paper_id, is_paper_identifier
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+from utils.similarity import TitleMatcher, normalize_title
+
 
 class PaperRecommendationsTool(Tool):
     """
-    Get paper recommendations based on a given paper
+    Get paper recommendations based on one or more seed papers
     """
     
-    BASE_URL = "https://ai4scholar.net"
+    FIELDS = "paperId,title,authors,year,citationCount,venue,abstract,openAccessPdf"
+    
+    # Upper bound on positive plus negative seeds in one request
+    MAX_SEEDS = 100
     
+    # A title seed is accepted when the title-match hit is at least this similar
+    TITLE_THRESHOLD = 0.85
+    
+    @instrumented
+    @budgeted
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
         
         paper_id = tool_parameters.get("paper_id", "")
-        if not paper_id:
+        positive_seeds = self._split_seeds(tool_parameters.get("positive_papers", ""))
+        negative_seeds = self._split_seeds(tool_parameters.get("negative_papers", ""))
+        if paper_id:
+            positive_seeds.insert(0, paper_id.strip())
+        if not positive_seeds:
             yield self.create_text_message("Error: Paper ID is required")
             return
         
+        if len(positive_seeds) + len(negative_seeds) > self.MAX_SEEDS:
+            positive_seeds = positive_seeds[:self.MAX_SEEDS]
+            negative_seeds = negative_seeds[:self.MAX_SEEDS - len(positive_seeds)]
+            yield self.create_text_message(f"Note: Limited to first {self.MAX_SEEDS} seed papers\n")
+        
         limit = min(max(int(tool_parameters.get("limit", 10)), 1), 100)
         
+        output_format = get_output_format(tool_parameters)
+        
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
         try:
-            # Use the recommendations endpoint
-            response = requests.get(
-                f"{self.BASE_URL}/recommendations/v1/papers/forpaper/{paper_id}",
-                headers={"Authorization": f"Bearer {api_key}"},
-                params={
-                    "fields": "paperId,title,authors,year,citationCount,venue,abstract,openAccessPdf",
-                    "limit": limit
-                },
-                timeout=30
-            )
+            # DOIs, arXiv IDs and titles are resolved to paperIds first: IDs
+            # in one batch lookup, titles through the title-match endpoint.
+            # A lone ID seed goes to the GET endpoint as is, which accepts
+            # external IDs, so it still costs one request.
+            seeds = positive_seeds + negative_seeds
+            status, resolved, unresolved = self._resolve_seeds(seeds, api_key, lookup_ids=len(seeds) > 1)
+            if status == 401:
+                yield self.create_text_message("Error: Invalid API key")
+                return
+            elif status == 402:
+                yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+                return
+            
+            positive_ids = list(dict.fromkeys(resolved[s][0] for s in positive_seeds if s in resolved))
+            negative_ids = list(dict.fromkeys(
+                resolved[s][0] for s in negative_seeds if s in resolved and resolved[s][0] not in positive_ids
+            ))
+            if not positive_ids:
+                lines = ["Error: None of the seed papers could be resolved"]
+                lines.extend(f"- {seed}: {reason}" for seed, reason in unresolved)
+                yield self.create_text_message("\n".join(lines))
+                return
+            
+            multi_seed = len(positive_ids) > 1 or bool(negative_ids)
+            if not multi_seed:
+                # A single seed keeps the GET endpoint and its cache entries
+                seed_id = positive_ids[0]
+                response = cached_get(
+                    "recommendations",
+                    seed_id,
+                    f"/recommendations/v1/papers/forpaper/{seed_id}",
+                    api_key,
+                    params={"fields": self.FIELDS, "limit": limit},
+                    storage=self.session.storage
+                )
+            else:
+                # One POST replaces a request per seed; a few extra results
+                # are asked for since seeds are dropped from the list
+                response = cached_post(
+                    "recommendations",
+                    f"+{','.join(sorted(positive_ids))}|-{','.join(sorted(negative_ids))}",
+                    "/recommendations/v1/papers",
+                    api_key,
+                    params={"fields": self.FIELDS, "limit": min(limit + len(positive_ids) + len(negative_ids), 500)},
+                    json={"positivePaperIds": positive_ids, "negativePaperIds": negative_ids},
+                    storage=self.session.storage
+                )
             
             if response.status_code == 401:
                 yield self.create_text_message("Error: Invalid API key")
@@ -46,20 +110,54 @@ class PaperRecommendationsTool(Tool):
                 yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
                 return
             elif response.status_code == 404:
-                yield self.create_text_message(f"Error: Paper not found or no recommendations available for: {paper_id}")
+                if multi_seed:
+                    yield self.create_text_message("Error: Papers not found or no recommendations available for the given seeds")
+                else:
+                    yield self.create_text_message(f"Error: Paper not found or no recommendations available for: {positive_ids[0]}")
                 return
             elif response.status_code != 200:
                 yield self.create_text_message(f"Error: API returned status {response.status_code}")
                 return
             
             data = response.json()
-            papers = data.get("recommendedPapers", [])
+            seed_titles = {resolved[s][1] for s in positive_seeds + negative_seeds if s in resolved and resolved[s][1]}
+            papers = self._exclude_seeds(
+                data.get("recommendedPapers", []), set(positive_ids) | set(negative_ids), seed_titles
+            )[:limit]
+            # Seeds left unresolved when the budget ran out were skipped
+            truncated = truncation_reason()
+            
+            if wants_json(output_format):
+                if multi_seed:
+                    payload = {"positive_paper_ids": positive_ids, "negative_paper_ids": negative_ids}
+                else:
+                    payload = {"paper_id": positive_ids[0]}
+                if unresolved:
+                    payload["unresolved_seeds"] = [{"seed": seed, "error": reason} for seed, reason in unresolved]
+                payload["papers"] = [normalize_paper(p) for p in papers]
+                if truncated:
+                    payload["truncated"] = truncated
+                yield self.create_json_message(payload)
+            if not wants_markdown(output_format):
+                return
+            
+            if multi_seed:
+                based_on = f"{len(positive_ids)} papers"
+                if negative_ids:
+                    based_on += f", excluding topics of {len(negative_ids)}"
+            else:
+                based_on = positive_ids[0]
             
             if not papers:
-                yield self.create_text_message(f"No recommendations found for paper: {paper_id}")
+                lines = [f"No recommendations found for paper: {based_on}"]
+                lines.extend(self._format_unresolved(unresolved))
+                yield self.create_text_message("\n".join(lines))
                 return
             
-            result_lines = [f"# Paper Recommendations\n**Based on:** {paper_id} | **Found:** {len(papers)} recommendations\n"]
+            result_lines = [f"# Paper Recommendations\n**Based on:** {based_on} | **Found:** {len(papers)} recommendations\n"]
+            if truncated:
+                result_lines.append(f"_Output truncated by {truncated}: seeds not resolved before it was reached were skipped._\n")
+            result_lines.extend(self._format_unresolved(unresolved))
             
             for i, paper in enumerate(papers, 1):
                 title = paper.get("title", "N/A")
@@ -91,10 +189,115 @@ class PaperRecommendationsTool(Tool):
                 result_lines.append("")
             
             yield self.create_text_message("\n".join(result_lines))
-            
+        
+        except BudgetExhausted as e:
+            yield self.create_text_message(f"Error: {str(e)} before recommendations were fetched")
         except requests.exceptions.Timeout:
             yield self.create_text_message("Error: Request timeout. Please try again.")
         except requests.exceptions.RequestException as e:
             yield self.create_text_message(f"Error: Network error - {str(e)}")
         except Exception as e:
             yield self.create_text_message(f"Error: {str(e)}")
+    
+    def _split_seeds(self, raw: str) -> list[str]:
+        # Newlines or semicolons, as in Bulk Search; titles may contain commas
+        # (the common case of comma-separated IDs is accepted too)
+        seeds = []
+        for part in re.split(r'[\n;]', raw or ""):
+            part = part.strip()
+            if not part:
+                continue
+            pieces = [p.strip() for p in part.split(",")]
+            if len(pieces) > 1 and all(is_paper_identifier(p) for p in pieces if p):
+                seeds.extend(p for p in pieces if p)
+            else:
+                seeds.append(part)
+        return list(dict.fromkeys(seeds))
+    
+    def _resolve_seeds(
+        self, seeds: list[str], api_key: str, lookup_ids: bool = True
+    ) -> tuple[int, dict[str, tuple[str, Optional[str]]], list[tuple[str, str]]]:
+        """
+        Map each seed to (paperId, normalized title or None); with
+        lookup_ids off, IDs the index does not know are kept in their
+        normalized form instead of being looked up. Returns the
+        first 401/402 status seen (else 200), the resolved seeds and the
+        (seed, reason) pairs that could not be resolved.
+        """
+        resolved: dict[str, tuple[str, Optional[str]]] = {}
+        unresolved: list[tuple[str, str]] = []
+        
+        lookups: dict[str, list[str]] = {}
+        titles: list[str] = []
+        for seed in dict.fromkeys(seeds):
+            if not is_paper_identifier(seed):
+                titles.append(seed)
+                continue
+            # The identifier index already knows most IDs seen before
+            canonical = canonical_paper_id(seed)
+            if not lookup_ids or re.fullmatch(r"[0-9a-f]{40}", canonical):
+                resolved[seed] = (canonical, None)
+            else:
+                lookups.setdefault(canonical, []).append(seed)
+        
+        if lookups:
+            batch = cached_batch(
+                "paper", "/graph/v1/paper/batch", list(lookups), api_key, "paperId,title"
+            )
+            if batch.status_code != 200:
+                return batch.status_code, resolved, unresolved
+            for canonical, originals in lookups.items():
+                record = batch.records.get(canonical)
+                for seed in originals:
+                    if record and record.get("paperId"):
+                        resolved[seed] = (record["paperId"], normalize_title(record.get("title") or "") or None)
+                    elif canonical in batch.failures:
+                        unresolved.append((seed, batch.failures[canonical][1]))
+                    else:
+                        unresolved.append((seed, "Paper not found"))
+        
+        if titles:
+            calls = [
+                ("paper_match", title, "/graph/v1/paper/search/match", {"query": title, "fields": "paperId,title,year"})
+                for title in titles
+            ]
+            for index, response in cached_get_many(calls, api_key, storage=self.session.storage):
+                title = titles[index]
+                if isinstance(response, Exception):
+                    unresolved.append((title, f"Title lookup failed: {str(response)}"))
+                    continue
+                if response.status_code in (401, 402):
+                    return response.status_code, resolved, unresolved
+                matched = response.json().get("data", [])[:1] if response.status_code == 200 else []
+                if matched and TitleMatcher(title).score(matched[0].get("title", "")) >= self.TITLE_THRESHOLD:
+                    resolved[title] = (matched[0]["paperId"], normalize_title(matched[0].get("title") or ""))
+                else:
+                    unresolved.append((title, "No paper with a matching title"))
+        
+        return 200, resolved, unresolved
+    
+    def _exclude_seeds(self, papers: list[dict], seed_ids: set[str], seed_titles: set[str]) -> list[dict]:
+        # Seeds (by paperId, or title for another version of the same
+        # paper) and repeated results are dropped
+        kept = []
+        seen_ids = set(seed_ids)
+        seen_titles = set(seed_titles)
+        for paper in papers:
+            rec_id = paper.get("paperId")
+            title = normalize_title(paper.get("title") or "")
+            if (rec_id and rec_id in seen_ids) or (title and title in seen_titles):
+                continue
+            if rec_id:
+                seen_ids.add(rec_id)
+            if title:
+                seen_titles.add(title)
+            kept.append(paper)
+        return kept
+    
+    def _format_unresolved(self, unresolved: list[tuple[str, str]]) -> list[str]:
+        if not unresolved:
+            return []
+        lines = ["_Seeds that could not be resolved and were skipped:_"]
+        lines.extend(f"- {seed}: {reason}" for seed, reason in unresolved)
+        lines.append("")
+        return lines
@@ -1,40 +1,99 @@
-from typing import Any, Generator
+import os
+from typing import Any, Generator, Optional
 import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.budget import BudgetExhausted, budgeted, truncation_reason
+from utils.client import CachedResponse, api_get, cached_get, parse_json
+from utils.fields import get_detail_level, resolve_fields
+from utils.metrics import instrumented
+from utils.pagination import MAX_BYTES, iter_token_pages
+from utils.ranking import rerank
+from utils.output import (
+    PaperExport,
+    get_export_format,
+    get_output_format,
+    normalize_paper,
+    wants_json,
+    wants_markdown,
+)
+
 
 class SemanticSearchTool(Tool):
     """
     Semantic search tool for finding academic papers by relevance
     """
     
-    BASE_URL = "https://ai4scholar.net"
+    # Fields rendered at each detail level (cumulative)
+    FIELD_SETS = {
+        "compact": ["paperId", "title", "year", "citationCount"],
+        "standard": ["authors", "venue", "abstract", "openAccessPdf"],
+        "full": ["publicationDate", "externalIds"],
+    }
+    
+    # Candidates fetched for local re-ranking (the search endpoint's maximum)
+    RERANK_POOL = 100
     
+    # Upper bound on papers one bulk-mode call walks through (1000 per page)
+    BULK_MAX_RESULTS = int(os.environ.get("AI4S_BULK_MAX_RESULTS", "10000"))
+    BULK_SORTS = (
+        "paperId",
+        "citationCount:desc",
+        "citationCount:asc",
+        "publicationDate:desc",
+        "publicationDate:asc",
+    )
+    
+    @instrumented
+    @budgeted
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
         
-        query = tool_parameters.get("query", "")
+        # Whitespace-normalized so repeat queries share one cache entry
+        query = " ".join(tool_parameters.get("query", "").split())
         if not query:
             yield self.create_text_message("Error: Search query is required")
             return
         
-        limit = min(max(int(tool_parameters.get("limit", 10)), 1), 100)
-        year = tool_parameters.get("year", "")
-        fields_of_study = tool_parameters.get("fields_of_study", "")
-        open_access_only = tool_parameters.get("open_access_only", False)
+        # Bulk mode walks /paper/search/bulk by continuation token for
+        # large, sortable result sets; the default is one relevance page
+        bulk = str(tool_parameters.get("search_mode") or "relevance").strip().lower() == "bulk"
+        
+        limit = min(max(int(tool_parameters.get("limit", 10)), 1), self.BULK_MAX_RESULTS if bulk else 100)
+        year = str(tool_parameters.get("year") or "").replace(" ", "")
+        fields_of_study = ",".join(sorted({
+            f.strip() for f in str(tool_parameters.get("fields_of_study") or "").split(",") if f.strip()
+        }))
+        open_access_only = bool(tool_parameters.get("open_access_only", False))
+        detail_level = get_detail_level(tool_parameters)
+        
+        # Optional local re-ranking: fetch a larger pool in one request,
+        # score it with BM25 (plus priors) and keep only the top `limit`
+        local_rerank = bool(tool_parameters.get("rerank", False)) and not bulk
+        candidate_pool = min(max(int(tool_parameters.get("candidate_pool") or self.RERANK_POOL), limit), 100)
+        citation_weight = float(tool_parameters.get("citation_weight") or 0)
+        recency_weight = float(tool_parameters.get("recency_weight") or 0)
+        
+        output_format = get_output_format(tool_parameters)
         
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
-        # Build request parameters
+        # Build request parameters. The filters are part of the cache key, so
+        # filtered and unfiltered searches never share an entry.
+        fields = resolve_fields(self.FIELD_SETS, detail_level)
+        # Re-ranking scores the abstract even when it is not shown
+        score_only_abstract = local_rerank and "abstract" not in fields
+        if score_only_abstract:
+            fields.append("abstract")
         params = {
             "query": query,
-            "limit": limit,
-            "fields": "paperId,title,authors,year,abstract,citationCount,openAccessPdf,venue,publicationDate,externalIds"
+            "limit": candidate_pool if local_rerank else limit,
+            "fields": ",".join(fields)
         }
         
         if year:
@@ -45,11 +104,34 @@ class SemanticSearchTool(Tool):
             params["openAccessPdf"] = ""
         
         try:
-            response = requests.get(
-                f"{self.BASE_URL}/graph/v1/paper/search",
-                headers={"Authorization": f"Bearer {api_key}"},
+            if bulk:
+                del params["limit"]
+                sort = str(tool_parameters.get("sort") or "").strip()
+                if sort in self.BULK_SORTS:
+                    params["sort"] = sort
+                export_format = get_export_format(tool_parameters)
+                if not export_format and not wants_json(output_format):
+                    # Bulk Markdown is one line per paper, whatever the
+                    # detail level: only fetch what that line shows
+                    params["fields"] = ",".join(resolve_fields(self.FIELD_SETS, "compact"))
+                yield from self._bulk_search(
+                    query,
+                    params,
+                    limit,
+                    output_format,
+                    export_format,
+                    bool(tool_parameters.get("stream", False)),
+                    api_key
+                )
+                return
+            
+            response = cached_get(
+                "paper_search",
+                query,
+                "/graph/v1/paper/search",
+                api_key,
                 params=params,
-                timeout=30
+                storage=self.session.storage
             )
             
             if response.status_code == 401:
@@ -65,35 +147,88 @@ class SemanticSearchTool(Tool):
             data = response.json()
             papers = data.get("data", [])
             total = data.get("total", 0)
+            # Set when a cached result past its TTL was served while it is
+            # refreshed in the background
+            stale_for = getattr(response, "stale_for", 0)
+            
+            candidates = len(papers)
+            scores = None
+            if local_rerank:
+                ranked = rerank(query, papers, limit, citation_weight, recency_weight)
+                scores = [score for score, _ in ranked]
+                papers = [paper for _, paper in ranked]
+                if score_only_abstract:
+                    papers = [{k: v for k, v in paper.items() if k != "abstract"} for paper in papers]
+            
+            if wants_json(output_format):
+                records = [normalize_paper(p) for p in papers]
+                result = {
+                    "query": query,
+                    "total": total,
+                    "papers": records
+                }
+                if scores is not None:
+                    for record, score in zip(records, scores):
+                        record["relevance"] = round(score, 4)
+                    result["candidates"] = candidates
+                if stale_for:
+                    result["stale"] = True
+                yield self.create_json_message(result)
+            if not wants_markdown(output_format):
+                return
             
             if not papers:
                 yield self.create_text_message(f"No papers found for query: {query}")
                 return
             
             # Format results
-            result_lines = [f"Found {total} papers for query: \"{query}\" (showing {len(papers)})\n"]
+            if scores is not None:
+                result_lines = [f"Found {total} papers for query: \"{query}\" (top {len(papers)} of {candidates} candidates, re-ranked locally)\n"]
+            else:
+                result_lines = [f"Found {total} papers for query: \"{query}\" (showing {len(papers)})\n"]
+            if stale_for:
+                result_lines.append("_Cached result; an update is running in the background._\n")
             
             for i, paper in enumerate(papers, 1):
                 paper_id = paper.get("paperId", "N/A")
                 title = paper.get("title", "N/A")
+                year = paper.get("year", "N/A")
+                citations = paper.get("citationCount", 0)
+                
+                if scores is not None:
+                    result_lines.append(f"### {i}. {title} (relevance {scores[i - 1]:.2f})")
+                else:
+                    result_lines.append(f"### {i}. {title}")
+                
+                if detail_level == "compact":
+                    result_lines.append(f"**Year:** {year} | **Citations:** {citations} | **Paper ID:** {paper_id}")
+                    result_lines.append("")
+                    continue
+                
                 authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:3]])
                 if len(paper.get("authors", [])) > 3:
                     authors += " et al."
-                year = paper.get("year", "N/A")
-                citations = paper.get("citationCount", 0)
                 venue = paper.get("venue", "")
                 abstract = paper.get("abstract", "")
-                if abstract and len(abstract) > 300:
+                if abstract and len(abstract) > 300 and detail_level != "full":
                     abstract = abstract[:300] + "..."
                 
                 open_access = paper.get("openAccessPdf")
                 pdf_url = open_access.get("url", "") if open_access else ""
                 
-                result_lines.append(f"### {i}. {title}")
                 result_lines.append(f"**Authors:** {authors}")
                 result_lines.append(f"**Year:** {year} | **Citations:** {citations}")
                 if venue:
                     result_lines.append(f"**Venue:** {venue}")
+                if detail_level == "full":
+                    publication_date = paper.get("publicationDate", "")
+                    external_ids = paper.get("externalIds") or {}
+                    if publication_date:
+                        result_lines.append(f"**Published:** {publication_date}")
+                    if external_ids.get("DOI"):
+                        result_lines.append(f"**DOI:** {external_ids['DOI']}")
+                    if external_ids.get("ArXiv"):
+                        result_lines.append(f"**arXiv:** {external_ids['ArXiv']}")
                 if abstract:
                     result_lines.append(f"**Abstract:** {abstract}")
                 if pdf_url:
@@ -102,10 +237,159 @@ class SemanticSearchTool(Tool):
                 result_lines.append("")
             
             yield self.create_text_message("\n".join(result_lines))
-            
+        
         except requests.exceptions.Timeout:
             yield self.create_text_message("Error: Request timeout. Please try again.")
         except requests.exceptions.RequestException as e:
             yield self.create_text_message(f"Error: Network error - {str(e)}")
         except Exception as e:
             yield self.create_text_message(f"Error: {str(e)}")
+    
+    def _bulk_search(
+        self,
+        query: str,
+        params: dict,
+        limit: int,
+        output_format: str,
+        export_format: Optional[str],
+        stream: bool,
+        api_key: str
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        Walk /graph/v1/paper/search/bulk (up to 1000 papers per page) until
+        limit papers were seen. Pages are handled one at a time: streamed as
+        messages, or appended to an export file, or to the final message.
+        """
+        def fetch_page(token: Optional[str]):
+            page_params = dict(params, token=token) if token else params
+            # Not cached: a large walk would fill the response cache with
+            # pages that are rarely requested again. The page is parsed here,
+            # so a prefetched page is parsed on the prefetch thread too.
+            response = api_get("/graph/v1/paper/search/bulk", api_key, params=page_params)
+            if response.status_code != 200:
+                return response
+            return CachedResponse(parse_json(response, "/graph/v1/paper/search/bulk"), from_cache=False)
+        
+        sort = params.get("sort")
+        order = f", sorted by {sort}" if sort else ""
+        # Non-streamed exports accumulate in one spooled file
+        export = PaperExport(export_format, f"papers_{query}") if export_format and not stream else None
+        records: Optional[list[dict]] = [] if wants_json(output_format) and not stream and not export_format else None
+        result_lines: list[str] = []
+        render_markdown = wants_markdown(output_format) and not export_format
+        markdown_bytes = 0
+        markdown_full = False
+        total = 0
+        shown = 0
+        pages = 0
+        truncated = None
+        
+        try:
+            try:
+                for response, page in iter_token_pages(fetch_page, limit):
+                    if response.status_code == 401:
+                        yield self.create_text_message("Error: Invalid API key")
+                        return
+                    elif response.status_code == 402:
+                        yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+                        return
+                    elif response.status_code != 200:
+                        yield self.create_text_message(f"Error: API returned status {response.status_code}")
+                        return
+                    
+                    papers = page.get("data", [])
+                    total = page.get("total", total)
+                    if not papers:
+                        break
+                    pages += 1
+                    
+                    if export_format:
+                        if export is not None:
+                            export.write(papers)
+                        else:
+                            # Streamed exports send one file per page
+                            part = PaperExport(export_format, f"papers_{query}_part{pages:03d}")
+                            try:
+                                part.write(papers)
+                                yield self.create_blob_message(part.getvalue(), meta=part.meta())
+                            finally:
+                                part.close()
+                    elif stream and wants_json(output_format):
+                        yield self.create_json_message({
+                            "query": query,
+                            "total": total,
+                            "offset": shown,
+                            "papers": [normalize_paper(p) for p in papers]
+                        })
+                    elif records is not None:
+                        records.extend(normalize_paper(p) for p in papers)
+                    
+                    if render_markdown and not markdown_full:
+                        lines = []
+                        if shown == 0:
+                            lines.append(f"Found {total} papers for query: \"{query}\" (bulk mode{order}, up to {limit})\n")
+                        for i, paper in enumerate(papers, shown + 1):
+                            lines.append(
+                                f"{i}. **{paper.get('title', 'N/A')}** ({paper.get('year', 'N/A')}) | "
+                                f"Citations: {paper.get('citationCount', 0)} | ID: {paper.get('paperId', '')}"
+                            )
+                        text = "\n".join(lines)
+                        markdown_bytes += len(text.encode("utf-8"))
+                        if stream:
+                            yield self.create_text_message(text)
+                        else:
+                            result_lines.append(text)
+                        markdown_full = markdown_bytes >= MAX_BYTES
+                    
+                    shown += len(papers)
+                    
+                    # With Markdown as the only output there is nothing left to fill
+                    if markdown_full and not wants_json(output_format):
+                        break
+            except BudgetExhausted:
+                # Pages already handled stand; report where the walk stopped
+                truncated = truncation_reason() or "deadline"
+            
+            if export is not None and shown:
+                yield self.create_blob_message(export.getvalue(), meta=export.meta())
+            
+            if wants_json(output_format):
+                result = {"query": query, "total": total, "returned": shown}
+                if sort:
+                    result["sort"] = sort
+                if export_format:
+                    result["export_format"] = export_format
+                    if export is not None:
+                        result["filename"] = export.filename
+                    elif pages:
+                        result["files"] = pages
+                elif records is not None:
+                    result["papers"] = records
+                if truncated:
+                    result["truncated"] = truncated
+                yield self.create_json_message(result)
+            if not wants_markdown(output_format):
+                return
+            
+            if shown == 0:
+                yield self.create_text_message(f"No papers found for query: {query}")
+                return
+            
+            if export_format:
+                target = export.filename if export is not None else f"{pages} files"
+                result_lines.append(
+                    f"Exported {shown} of {total} papers for query: \"{query}\" (bulk mode{order}) to {target}"
+                )
+            elif markdown_full:
+                result_lines.append(
+                    f"\n_Markdown output stops at the size limit; use the JSON output or export_format for all {shown} papers._"
+                )
+            elif stream:
+                result_lines.append(f"\n**Total shown:** {shown} of {total} papers")
+            if truncated:
+                result_lines.append(f"\n_Output truncated at {shown} papers ({truncated} reached)._")
+            if result_lines:
+                yield self.create_text_message("\n".join(result_lines))
+        finally:
+            if export is not None:
+                export.close()
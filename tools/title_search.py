@@ -3,14 +3,26 @@ import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+from utils.client import cached_get
+from utils.metrics import instrumented
+from utils.output import get_output_format, normalize_paper, wants_json, wants_markdown
+from utils.similarity import TitleMatcher, confidence_label
+
 
 class TitleSearchTool(Tool):
     """
     Search for papers by title
     """
     
-    BASE_URL = "https://ai4scholar.net"
+    FIELDS = "paperId,title,authors,year,abstract,citationCount,openAccessPdf,venue,externalIds"
+    
+    # Candidates fetched in the single search request and re-ranked locally
+    CANDIDATE_WINDOW = 20
+    
+    # A title-match hit at least this similar is returned without searching
+    MATCH_THRESHOLD = 0.9
     
+    @instrumented
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -22,26 +34,32 @@ class TitleSearchTool(Tool):
         
         year = tool_parameters.get("year")
         
+        output_format = get_output_format(tool_parameters)
+        
         api_key = self.runtime.credentials.get("api_key", "")
         if not api_key:
             yield self.create_text_message("Error: API key is required")
             return
         
-        params = {
-            "query": title,
-            "limit": 5,
-            "fields": "paperId,title,authors,year,abstract,citationCount,openAccessPdf,venue,publicationDate,externalIds"
-        }
+        year = int(year) if year else None
+        matcher = TitleMatcher(title, year)
         
+        # The year is widened by one on each side: preprint and publication
+        # years often differ, and candidates are ranked by year proximity
+        params = {"query": title, "fields": self.FIELDS}
         if year:
-            params["year"] = str(int(year))
+            params["year"] = f"{year - 1}-{year + 1}"
         
         try:
-            response = requests.get(
-                f"{self.BASE_URL}/graph/v1/paper/search",
-                headers={"Authorization": f"Bearer {api_key}"},
+            # Fast path: the title-match endpoint returns the single closest
+            # paper; accept it when it agrees with the local score
+            response = cached_get(
+                "paper_match",
+                title,
+                "/graph/v1/paper/search/match",
+                api_key,
                 params=params,
-                timeout=30
+                storage=self.session.storage
             )
             
             if response.status_code == 401:
@@ -50,23 +68,59 @@ class TitleSearchTool(Tool):
             elif response.status_code == 402:
                 yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
                 return
-            elif response.status_code != 200:
-                yield self.create_text_message(f"Error: API returned status {response.status_code}")
-                return
             
-            data = response.json()
-            papers = data.get("data", [])
+            # Anything else (404 when no title matches) falls back to search
+            matched = response.json().get("data", [])[:1] if response.status_code == 200 else []
+            ranked = [(matcher.score(p.get("title", ""), p.get("year")), p) for p in matched]
+            match_source = "match"
             
-            if not papers:
+            if not ranked or ranked[0][0] < self.MATCH_THRESHOLD:
+                response = cached_get(
+                    "paper_search",
+                    title,
+                    "/graph/v1/paper/search",
+                    api_key,
+                    params={**params, "limit": self.CANDIDATE_WINDOW},
+                    storage=self.session.storage
+                )
+                
+                if response.status_code == 401:
+                    yield self.create_text_message("Error: Invalid API key")
+                    return
+                elif response.status_code == 402:
+                    yield self.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+                    return
+                elif response.status_code != 200:
+                    yield self.create_text_message(f"Error: API returned status {response.status_code}")
+                    return
+                
+                seen = {p.get("paperId") for _, p in ranked}
+                for p in response.json().get("data", []):
+                    if p.get("paperId") not in seen:
+                        ranked.append((matcher.score(p.get("title", ""), p.get("year")), p))
+                # Stable sort keeps the upstream order among equal scores
+                ranked.sort(key=lambda item: item[0], reverse=True)
+                match_source = "search"
+            
+            if wants_json(output_format):
+                yield self.create_json_message({
+                    "title": title,
+                    "match_source": match_source,
+                    "confidence": round(ranked[0][0], 3) if ranked else 0.0,
+                    "papers": [{**normalize_paper(p), "confidence": round(score, 3)} for score, p in ranked[:5]]
+                })
+            if not wants_markdown(output_format):
+                return
+            
+            if not ranked:
                 yield self.create_text_message(f"No papers found with title: {title}")
                 return
             
-            # Find best match by title similarity
-            best_match = papers[0]
+            best_score, paper = ranked[0]
             
-            result_lines = [f"Found paper matching title: \"{title}\"\n"]
+            result_lines = [f"Found paper matching title: \"{title}\""]
+            result_lines.append(f"**Match confidence:** {best_score:.2f} ({confidence_label(best_score)})\n")
             
-            paper = best_match
             paper_id = paper.get("paperId", "N/A")
             paper_title = paper.get("title", "N/A")
             authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])])
@@ -97,11 +151,14 @@ class TitleSearchTool(Tool):
                 result_lines.append(f"\n**PDF:** {pdf_url}")
             result_lines.append(f"\n**Paper ID:** {paper_id}")
             
+            if confidence_label(best_score) == "low":
+                result_lines.append("\n**Note:** No close title match; check the alternatives below or refine the title.")
+            
             # Show other matches if any
-            if len(papers) > 1:
+            if len(ranked) > 1:
                 result_lines.append("\n---\n**Other possible matches:**")
-                for p in papers[1:]:
-                    result_lines.append(f"- {p.get('title', 'N/A')} ({p.get('year', 'N/A')})")
+                for score, p in ranked[1:5]:
+                    result_lines.append(f"- {p.get('title', 'N/A')} ({p.get('year', 'N/A')}) | confidence {score:.2f} | ID: {p.get('paperId', 'N/A')}")
             
             yield self.create_text_message("\n".join(result_lines))
             
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import queue
+import selectors
+import sys
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+import requests
+
+from utils.budget import InvocationBudget, current_budget
+from utils.metrics import BYTES_BUCKETS, METRICS_ENABLED, InvocationStats, current_invocation, endpoint_label, registry
+from utils.ratelimit import MAX_RETRIES, RETRY_STATUSES, backoff_delay, parse_retry_after, rate_limiter
+
+# httpcore imports trio when it is installed and only tolerates ImportError;
+# under gevent (select.epoll removed) trio fails with AttributeError, which
+# would break every request. Mark it absent so httpcore skips it.
+try:
+    import trio  # noqa: F401
+except ImportError:
+    pass
+except Exception:
+    sys.modules["trio"] = None
+
+# httpx ships with dify_plugin but stays optional here: if it is missing or
+# fails to import, the requests backend is used
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# "httpx" runs multi-request fan-out as coroutines on one shared event loop;
+# "requests" (default) keeps the pooled requests session
+HTTP_BACKEND = os.environ.get("AI4S_HTTP_BACKEND", "requests").lower()
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("AI4S_ASYNC_MAX_CONNECTIONS", "64"))
+
+
+def async_enabled() -> bool:
+    return HTTP_BACKEND == "httpx" and httpx is not None
+
+
+class EventLoopThread:
+    """
+    One asyncio loop on a daemon thread, shared by every tool invocation,
+    with the httpx client that lives on it
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    # gevent's monkey patching removes select.epoll, so the
+                    # default selector cannot be used inside the plugin
+                    loop = asyncio.SelectorEventLoop(selectors.SelectSelector())
+                    threading.Thread(target=loop.run_forever, name="ai4s-event-loop", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def client(self):
+        """
+        The shared AsyncClient; only call from the loop thread
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+
+event_loop = EventLoopThread()
+
+
+def _convert_error(error: Exception) -> Exception:
+    """
+    Map httpx transport errors onto the requests exceptions tools catch
+    """
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(error) or "Request timed out")
+    if isinstance(error, httpx.TransportError):
+        return requests.exceptions.ConnectionError(str(error) or type(error).__name__)
+    return error
+
+
+async def _send(
+    method: str,
+    url: str,
+    path: str,
+    headers: dict,
+    params: Optional[dict],
+    json: Any,
+    timeout: float,
+    stats: Optional[InvocationStats],
+):
+    client = event_loop.client()
+    request = client.build_request(method, url, headers=headers, params=params, json=json, timeout=timeout)
+    if not METRICS_ENABLED:
+        response = await client.send(request)
+        return response
+
+    label = endpoint_label(path)
+    if stats is not None:
+        stats.begin()
+    try:
+        started = time.perf_counter()
+        try:
+            response = await client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            registry.inc("ai4s_upstream_responses_total", endpoint=label, status=type(_convert_error(e)).__name__)
+            raise
+        headers_at = time.perf_counter()
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        finished = time.perf_counter()
+    finally:
+        if stats is not None:
+            stats.end()
+
+    registry.observe("ai4s_upstream_seconds", headers_at - started, endpoint=label, phase="ttfb")
+    registry.observe("ai4s_upstream_seconds", finished - headers_at, endpoint=label, phase="download")
+    registry.observe("ai4s_upstream_response_bytes", len(body), buckets=BYTES_BUCKETS, endpoint=label)
+    registry.inc("ai4s_upstream_responses_total", endpoint=label, status=str(response.status_code))
+    return response
+
+
+async def async_request(
+    method: str,
+    base_url: str,
+    path: str,
+    headers: dict,
+    params: Optional[dict] = None,
+    json: Any = None,
+    timeout: float = 30,
+    stats: Optional[InvocationStats] = None,
+    budget: Optional[InvocationBudget] = None,
+):
+    """
+    Coroutine counterpart of client.api_request: same rate limiter, retry
+    policy, deadline and invocation budget, on the shared httpx client.
+    Returns an httpx.Response; transport errors surface as requests
+    exceptions.
+    """
+    deadline = time.monotonic() + timeout
+    if budget is not None:
+        deadline = budget.cap(deadline)
+    attempt = 0
+    while True:
+        if budget is not None:
+            budget.charge()
+        if METRICS_ENABLED:
+            queued = time.perf_counter()
+            await rate_limiter.acquire_async(deadline)
+            registry.observe("ai4s_upstream_seconds", time.perf_counter() - queued, endpoint=endpoint_label(path), phase="queue")
+        else:
+            await rate_limiter.acquire_async(deadline)
+        remaining = max(deadline - time.monotonic(), 0.001)
+        try:
+            response = await _send(method, f"{base_url}{path}", path, headers, params, json, remaining, stats)
+        except httpx.TimeoutException as e:
+            raise _convert_error(e) from e
+        except httpx.TransportError as e:
+            delay = backoff_delay(attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+                raise _convert_error(e) from e
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                rate_limiter.on_success()
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429:
+                rate_limiter.on_throttle(retry_after)
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+                return response
+        rate_limiter.record_retry()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def request_many(
+    specs: list[tuple[str, str, Optional[dict], Any]],
+    base_url: str,
+    headers: dict,
+    timeout: float,
+    max_concurrency: int,
+) -> Iterator[tuple[int, Any]]:
+    """
+    Sync adapter: run (method, path, params, json) requests concurrently on
+    the shared event loop, at most max_concurrency at a time, and yield
+    (index, response) in completion order. A request that raised yields its
+    exception instead. Closing the iterator cancels what is still running.
+    """
+    if not specs:
+        return
+    loop = event_loop.loop()
+    stats = current_invocation()
+    budget = current_budget()
+    results: queue.Queue = queue.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def one(index: int, method: str, path: str, params: Optional[dict], json: Any) -> None:
+        try:
+            async with semaphore:
+                response = await async_request(method, base_url, path, headers, params, json, timeout, stats, budget)
+            results.put((index, response))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = _convert_error(e)
+            results.put((index, budget.check_timeout(error) if budget is not None else error))
+
+    async def start() -> list:
+        return [asyncio.ensure_future(one(i, *spec)) for i, spec in enumerate(specs)]
+
+    tasks = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    remaining = len(specs)
+    # Every request carries its own deadline, which only starts once it
+    # holds a semaphore slot; this only guards against a wedged loop, so it
+    # fires when no request has finished for a whole request timeout
+    try:
+        while remaining:
+            try:
+                item = results.get(timeout=timeout + 5)
+            except queue.Empty:
+                raise requests.exceptions.Timeout("Event loop did not complete the requests in time")
+            remaining -= 1
+            yield item
+    finally:
+        if remaining:
+            for task in tasks:
+                loop.call_soon_threadsafe(task.cancel)
+
@@ -0,0 +1,141 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import requests
+
+
+# Applied when a tool call sets no deadline_seconds; 0 means none
+DEFAULT_DEADLINE = float(os.environ.get("AI4S_DEFAULT_DEADLINE", "0"))
+
+
+class BudgetExhausted(requests.exceptions.Timeout):
+    """
+    Raised instead of sending a request once the invocation deadline has
+    passed or its request budget is spent
+    """
+
+
+class InvocationBudget:
+    """
+    Wall-clock deadline and API request (credit) allowance shared by every
+    upstream request of one tool invocation. Each attempt, retries included,
+    is charged one request; cache hits are free.
+    """
+
+    def __init__(self, deadline_seconds: Optional[float] = None, max_requests: Optional[int] = None):
+        self.deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+        self.max_requests = max_requests or None
+        self.requests = 0
+        # "deadline" or "request budget" once a request was refused
+        self.truncated: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_parameters(cls, tool_parameters: dict[str, Any]) -> Optional["InvocationBudget"]:
+        deadline_seconds = _positive(tool_parameters.get("deadline_seconds"), float) or DEFAULT_DEADLINE
+        max_requests = _positive(tool_parameters.get("max_requests"), int)
+        if not deadline_seconds and not max_requests:
+            return None
+        return cls(deadline_seconds, max_requests)
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def cap(self, deadline: float) -> float:
+        """
+        Shorten a request's own deadline to the invocation deadline
+        """
+        return deadline if self.deadline is None else min(deadline, self.deadline)
+
+    def exhausted(self, reason: str) -> BudgetExhausted:
+        with self._lock:
+            if self.truncated is None:
+                self.truncated = reason
+        return BudgetExhausted(f"Invocation {reason} reached")
+
+    def charge(self) -> None:
+        """
+        Account for one request about to be sent, or raise BudgetExhausted
+        """
+        if self.expired():
+            raise self.exhausted("deadline")
+        with self._lock:
+            if self.max_requests is not None and self.requests >= self.max_requests:
+                over = True
+            else:
+                over = False
+                self.requests += 1
+        if over:
+            raise self.exhausted("request budget")
+
+    def check_timeout(self, error: Exception) -> Exception:
+        """
+        A timeout caused by the invocation deadline rather than the request's
+        own timeout is reported as BudgetExhausted
+        """
+        if isinstance(error, requests.exceptions.Timeout) and not isinstance(error, BudgetExhausted) and self.expired():
+            return self.exhausted("deadline")
+        return error
+
+
+def _positive(value: Any, kind: type) -> Any:
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+_current: contextvars.ContextVar[Optional[InvocationBudget]] = contextvars.ContextVar("ai4s_budget", default=None)
+
+
+def current_budget() -> Optional[InvocationBudget]:
+    return _current.get()
+
+
+def truncation_reason() -> Optional[str]:
+    """
+    Why the running invocation stopped early, or None if it did not
+    """
+    budget = _current.get()
+    return budget.truncated if budget is not None else None
+
+
+def budgeted(invoke: Callable) -> Callable:
+    """
+    Decorator for Tool._invoke reading the deadline_seconds and max_requests
+    parameters into an InvocationBudget that every request the tool makes
+    (including fan-out and prefetch work) is checked against
+    """
+
+    @functools.wraps(invoke)
+    def wrapper(self, tool_parameters: dict[str, Any]):
+        budget = InvocationBudget.from_parameters(tool_parameters)
+        generator = invoke(self, tool_parameters)
+        if budget is None:
+            yield from generator
+            return
+        try:
+            while True:
+                # Only active while the tool runs, as with the metrics context
+                token = _current.set(budget)
+                try:
+                    message = next(generator)
+                except StopIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                yield message
+        finally:
+            generator.close()
+
+    return wrapper
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# Seconds a cached response stays fresh, per logical endpoint. Detail
+# metadata changes slowly; search rankings drift faster.
+ENDPOINT_TTLS = {
+    "paper": 6 * 3600,
+    "author": 6 * 3600,
+    "paper_citations": 3600,
+    "paper_references": 6 * 3600,
+    "author_papers": 3600,
+    "recommendations": 3600,
+    "paper_match": 6 * 3600,
+    "paper_search": 600,
+    "author_search": 600,
+}
+DEFAULT_TTL = 600
+
+# Seconds past its TTL a search result may still be served, stale, while it
+# is refreshed in the background (stale-while-revalidate). Endpoints not
+# listed expire outright.
+ENDPOINT_STALE_TTLS = {
+    "paper_search": float(os.environ.get("AI4S_SEARCH_STALE_TTL", str(6 * 3600))),
+}
+
+CACHE_MAX_ENTRIES = int(os.environ.get("AI4S_CACHE_MAX_ENTRIES", "2048"))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a per-entry TTL. An
+    entry stored with a stale_ttl is kept that much longer: get() treats it
+    as a miss, but get_entry() still returns it, marked stale.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict[Hashable, tuple[float, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.get_entry(key, allow_stale=False)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: Hashable, allow_stale: bool = True) -> Optional[tuple[Any, float]]:
+        """
+        Return (value, stale_for): stale_for is 0 for a fresh entry, else the
+        seconds since its TTL ran out
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            fresh_until, keep_until, value = entry
+            now = time.monotonic()
+            if keep_until <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            stale_for = max(now - fresh_until, 0.0)
+            if stale_for and not allow_stale:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if stale_for:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return value, stale_for
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            fresh_until = time.monotonic() + ttl
+            self._data[key] = (fresh_until, fresh_until + max(stale_ttl, 0), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+response_cache = TTLCache(CACHE_MAX_ENTRIES)
+
+
+def make_key(endpoint: str, item_id: str, params: Optional[dict] = None) -> tuple:
+    """
+    Cache key of (endpoint, id, fields, other params). Parameters other than
+    fields (limits, filters) are folded in so different projections or
+    filters never share an entry.
+    """
+    params = params or {}
+    fields = params.get("fields", "")
+    extra = tuple(sorted((k, str(v)) for k, v in params.items() if k != "fields"))
+    return (endpoint, item_id, fields, extra)
+
+
+def ttl_for(endpoint: str) -> float:
+    return ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL)
+
+
+def stale_ttl_for(endpoint: str) -> float:
+    return ENDPOINT_STALE_TTLS.get(endpoint, 0)
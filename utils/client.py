@@ -0,0 +1,652 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import async_client
+from utils.budget import BudgetExhausted, InvocationBudget, current_budget
+from utils.cache import make_key, response_cache, stale_ttl_for, ttl_for
+from utils.concurrency import fan_out
+from utils.identifiers import id_index
+from utils.metrics import BYTES_BUCKETS, METRICS_ENABLED, current_invocation, endpoint_label, registry
+from utils.persistent_cache import persistent_cache
+from utils.ratelimit import (
+    MAX_RETRIES,
+    RETRY_STATUSES,
+    backoff_delay,
+    parse_retry_after,
+    rate_limiter,
+)
+from utils.revalidation import revalidator
+from utils.singleflight import SingleFlight
+
+
+BASE_URL = os.environ.get("AI4S_BASE_URL", "https://ai4scholar.net").rstrip("/")
+DEFAULT_TIMEOUT = 30
+
+POOL_CONNECTIONS = int(os.environ.get("AI4S_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("AI4S_POOL_MAXSIZE", "32"))
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that can report how many requests were served by reused
+    kept-alive connections versus newly opened ones
+    """
+
+    def connection_stats(self) -> tuple[int, int]:
+        """
+        Return (requests_sent, connections_opened) summed over live pools
+        """
+        pools = self.poolmanager.pools
+        sent = opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            sent += pool.num_requests
+            opened += pool.num_connections
+        return sent, opened
+
+
+in_flight = SingleFlight()
+
+_session: Optional[requests.Session] = None
+_adapter: Optional[PooledHTTPAdapter] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide session shared by all tools
+    """
+    global _session, _adapter
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = PooledHTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    pool_block=True,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                _adapter = adapter
+                _session = session
+    return _session
+
+
+def api_key_hash(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def auth_headers(api_key: str) -> dict:
+    return {"Authorization": f"Bearer {api_key}"}
+
+
+def api_request(
+    method: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict] = None,
+    json: Any = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> requests.Response:
+    """
+    Send a request to the ai4scholar.net API through the shared session.
+
+    Every attempt passes the shared rate limiter. 429 and 5xx responses and
+    connection errors are retried with jittered exponential backoff (or the
+    server's Retry-After) as long as the whole call fits in timeout seconds;
+    otherwise the last response is returned for the caller to report.
+
+    Inside a tool call with a budget (see utils.budget) every attempt is
+    charged against it and the timeout shrinks to the invocation deadline;
+    once either runs out BudgetExhausted is raised instead.
+    """
+    budget = current_budget()
+    deadline = time.monotonic() + timeout
+    if budget is None:
+        return _request(method, path, api_key, params, json, deadline, None)
+    try:
+        return _request(method, path, api_key, params, json, budget.cap(deadline), budget)
+    except requests.exceptions.Timeout as e:
+        error = budget.check_timeout(e)
+        if error is e:
+            raise
+        raise error from e
+
+
+def _request(
+    method: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict],
+    json: Any,
+    deadline: float,
+    budget: Optional[InvocationBudget],
+) -> requests.Response:
+    attempt = 0
+    while True:
+        if budget is not None:
+            budget.charge()
+        if METRICS_ENABLED:
+            queued = time.perf_counter()
+            rate_limiter.acquire(deadline)
+            registry.observe("ai4s_upstream_seconds", time.perf_counter() - queued, endpoint=endpoint_label(path), phase="queue")
+        else:
+            rate_limiter.acquire(deadline)
+        remaining = deadline - time.monotonic()
+        try:
+            response = _send(method, path, api_key, params, json, max(remaining, 0.001))
+        except requests.exceptions.ConnectionError:
+            delay = backoff_delay(attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                rate_limiter.on_success()
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429:
+                rate_limiter.on_throttle(retry_after)
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+                return response
+            response.close()
+        rate_limiter.record_retry()
+        time.sleep(delay)
+        attempt += 1
+
+
+def _send(
+    method: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict],
+    json: Any,
+    timeout: float,
+) -> requests.Response:
+    """
+    One HTTP attempt. With metrics enabled the body is streamed so time to
+    first byte (connect, send and server time) and body download are timed
+    separately; either way the body is fully read before returning.
+    """
+    if not METRICS_ENABLED:
+        return get_session().request(
+            method, f"{BASE_URL}{path}", headers=auth_headers(api_key), params=params, json=json, timeout=timeout
+        )
+
+    label = endpoint_label(path)
+    stats = current_invocation()
+    if stats is not None:
+        stats.begin()
+    try:
+        started = time.perf_counter()
+        try:
+            response = get_session().request(
+                method,
+                f"{BASE_URL}{path}",
+                headers=auth_headers(api_key),
+                params=params,
+                json=json,
+                timeout=timeout,
+                stream=True,
+            )
+        except requests.exceptions.RequestException as e:
+            registry.inc("ai4s_upstream_responses_total", endpoint=label, status=type(e).__name__)
+            raise
+        headers_at = time.perf_counter()
+        body = response.content
+        finished = time.perf_counter()
+    finally:
+        if stats is not None:
+            stats.end()
+
+    registry.observe("ai4s_upstream_seconds", headers_at - started, endpoint=label, phase="ttfb")
+    registry.observe("ai4s_upstream_seconds", finished - headers_at, endpoint=label, phase="download")
+    registry.observe("ai4s_upstream_response_bytes", len(body or b""), buckets=BYTES_BUCKETS, endpoint=label)
+    registry.inc("ai4s_upstream_responses_total", endpoint=label, status=str(response.status_code))
+    return response
+
+
+def parse_json(response: requests.Response, path: str) -> Any:
+    if not METRICS_ENABLED:
+        return response.json()
+    started = time.perf_counter()
+    payload = response.json()
+    registry.observe("ai4s_upstream_seconds", time.perf_counter() - started, endpoint=endpoint_label(path), phase="parse")
+    return payload
+
+
+def api_get(
+    path: str,
+    api_key: str,
+    params: Optional[dict] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> requests.Response:
+    return api_request("GET", path, api_key, params=params, timeout=timeout)
+
+
+def api_post(
+    path: str,
+    api_key: str,
+    params: Optional[dict] = None,
+    json: Any = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> requests.Response:
+    return api_request("POST", path, api_key, params=params, json=json, timeout=timeout)
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for a successful requests.Response whose JSON body has
+    already been parsed, either just now or from the response cache.
+    stale_for is the seconds a stale-while-revalidate entry is past its TTL
+    (0 when fresh).
+    """
+
+    status_code = 200
+
+    def __init__(self, payload: Any, from_cache: bool, stale_for: float = 0.0):
+        self._payload = payload
+        self.from_cache = from_cache
+        self.stale_for = stale_for
+
+    def json(self) -> Any:
+        return self._payload
+
+
+def cache_entry(key: tuple, storage=None) -> Optional[tuple[Any, float]]:
+    """
+    Look a key up in the in-process cache, then in plugin storage. Returns
+    (payload, stale_for); entries within their stale window are included.
+    """
+    entry = response_cache.get_entry(key)
+    if entry is not None:
+        return entry
+    stored = persistent_cache.get(storage, key)
+    if stored is None:
+        return None
+    payload, remaining_ttl, remaining_stale_ttl = stored
+    fresh_for = max(remaining_ttl, 0.0)
+    response_cache.set(key, payload, fresh_for, remaining_stale_ttl - fresh_for)
+    return payload, max(-remaining_ttl, 0.0)
+
+
+def cache_lookup(key: tuple, storage=None) -> Optional[Any]:
+    """
+    Fresh payload for key, or None
+    """
+    entry = cache_entry(key, storage)
+    if entry is None or entry[1]:
+        return None
+    return entry[0]
+
+
+def cache_store(key: tuple, payload: Any, ttl: float, storage=None, stale_ttl: float = 0) -> None:
+    response_cache.set(key, payload, ttl, stale_ttl)
+    persistent_cache.put(storage, key, payload, ttl, stale_ttl)
+
+
+def learn_identifiers(endpoint: str, item_id: str, payload: Any, params: Optional[dict], storage=None) -> None:
+    """
+    Feed a fresh payload to the identifier index. A paper fetched by an
+    external ID is also cached under its paperId, so every later spelling
+    of the same paper shares one entry.
+    """
+    id_index.learn_payload(payload)
+    if endpoint != "paper" or not isinstance(payload, dict):
+        return
+    paper_id = payload.get("paperId")
+    if paper_id and paper_id != item_id:
+        id_index.add(item_id, paper_id)
+        cache_store(make_key(endpoint, paper_id, params), payload, ttl_for(endpoint), storage)
+
+
+def _flight_key(endpoint: str, item_id: str, path: str, api_key: str, params: Optional[dict]) -> tuple:
+    return (path, make_key(endpoint, item_id, params)[2:], api_key_hash(api_key))
+
+
+def _fetch(
+    endpoint: str,
+    item_id: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict],
+    timeout: float,
+    storage,
+):
+    """
+    GET path and cache a 200 response; other responses are returned as is
+    """
+    response = api_get(path, api_key, params=params, timeout=timeout)
+    if response.status_code != 200:
+        return response
+    payload = parse_json(response, path)
+    cache_store(make_key(endpoint, item_id, params), payload, ttl_for(endpoint), storage, stale_ttl_for(endpoint))
+    learn_identifiers(endpoint, item_id, payload, params, storage)
+    return CachedResponse(payload, from_cache=False)
+
+
+def _from_cache(
+    endpoint: str,
+    item_id: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict],
+    timeout: float,
+    storage,
+) -> Optional[CachedResponse]:
+    """
+    Cached response for a GET, or None. A stale entry is returned at once
+    and refreshed in the background; if the refresh fails it stays in place
+    and is served until its stale window closes.
+    """
+    entry = cache_entry(make_key(endpoint, item_id, params), storage)
+    if entry is None:
+        return None
+    payload, stale_for = entry
+    if stale_for:
+        # The refresh usually outlives the invocation and its session
+        # storage, so it only updates the in-process cache
+        revalidator.submit(
+            _flight_key(endpoint, item_id, path, api_key, params),
+            lambda: _fetch(endpoint, item_id, path, api_key, params, timeout, None).status_code == 200,
+        )
+    return CachedResponse(payload, from_cache=True, stale_for=stale_for)
+
+
+def cached_get(
+    endpoint: str,
+    item_id: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    storage=None,
+):
+    """
+    GET through the shared response cache. Only 200 responses are cached;
+    anything else is returned untouched so callers keep their status checks.
+    Pass the session storage to also use the persistent tier. Endpoints with
+    a stale TTL (search) serve stale entries while revalidating them.
+    """
+    cached = _from_cache(endpoint, item_id, path, api_key, params, timeout, storage)
+    if cached is not None:
+        return cached
+
+    # Identical requests already on the wire are joined rather than repeated
+    return in_flight.do(
+        _flight_key(endpoint, item_id, path, api_key, params),
+        lambda: _fetch(endpoint, item_id, path, api_key, params, timeout, storage),
+    )
+
+
+def cached_post(
+    endpoint: str,
+    item_id: str,
+    path: str,
+    api_key: str,
+    params: Optional[dict] = None,
+    json: Any = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    storage=None,
+):
+    """
+    POST through the shared response cache, for read-only POST endpoints.
+    item_id must identify the request body, since the body is not part of
+    the cache key. Only 200 responses are cached.
+    """
+    key = make_key(endpoint, item_id, params)
+    cached = cache_lookup(key, storage)
+    if cached is not None:
+        return CachedResponse(cached, from_cache=True)
+
+    def fetch():
+        response = api_post(path, api_key, params=params, json=json, timeout=timeout)
+        if response.status_code != 200:
+            return response
+        payload = parse_json(response, path)
+        cache_store(key, payload, ttl_for(endpoint), storage)
+        id_index.learn_payload(payload)
+        return CachedResponse(payload, from_cache=False)
+
+    return in_flight.do(_flight_key(endpoint, item_id, path, api_key, params) + (item_id,), fetch)
+
+
+def request_many(
+    specs: list[tuple[str, str, Optional[dict], Any]],
+    api_key: str,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_concurrency: int = 5,
+) -> Iterator[tuple[int, Any]]:
+    """
+    Send (method, path, params, json) requests concurrently and yield
+    (index, response) in completion order, or the exception a request
+    raised. With AI4S_HTTP_BACKEND=httpx they run as coroutines on the
+    shared event loop; otherwise on a bounded pool over the requests session.
+    Closing the iterator cancels requests that have not completed.
+    """
+    if async_client.async_enabled():
+        yield from async_client.request_many(specs, BASE_URL, auth_headers(api_key), timeout, max_concurrency)
+        return
+
+    def send(spec: tuple) -> Any:
+        method, path, params, json = spec
+        try:
+            return api_request(method, path, api_key, params=params, json=json, timeout=timeout)
+        except Exception as e:
+            return e
+
+    yield from fan_out(send, specs, max_concurrency)
+
+
+def cached_get_many(
+    calls: list[tuple[str, str, str, Optional[dict]]],
+    api_key: str,
+    storage=None,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_concurrency: int = 5,
+) -> Iterator[tuple[int, Any]]:
+    """
+    cached_get for a list of (endpoint, item_id, path, params) calls, yielded
+    as (index, response) in completion order; a call that raised yields its
+    exception. Cache hits come first. With the httpx backend the misses are
+    deduplicated and fanned out on the shared event loop; otherwise each
+    call goes through cached_get on a bounded pool.
+    """
+    if not async_client.async_enabled():
+        def get(call: tuple) -> Any:
+            endpoint, item_id, path, params = call
+            try:
+                return cached_get(endpoint, item_id, path, api_key, params=params, timeout=timeout, storage=storage)
+            except Exception as e:
+                return e
+
+        yield from fan_out(get, calls, max_concurrency)
+        return
+
+    waiting: dict[tuple, list[int]] = {}
+    pending = []
+    for index, (endpoint, item_id, path, params) in enumerate(calls):
+        cached = _from_cache(endpoint, item_id, path, api_key, params, timeout, storage)
+        if cached is not None:
+            yield index, cached
+            continue
+        key = make_key(endpoint, item_id, params)
+        group = (path, key[2:])
+        if group not in waiting:
+            waiting[group] = []
+            pending.append((group, endpoint, item_id, path, params, key))
+        waiting[group].append(index)
+
+    specs = [("GET", path, params, None) for _, _, _, path, params, _ in pending]
+    responses = request_many(specs, api_key, timeout=timeout, max_concurrency=max_concurrency)
+    try:
+        for position, response in responses:
+            group, endpoint, item_id, path, params, key = pending[position]
+            if not isinstance(response, Exception) and response.status_code == 200:
+                try:
+                    payload = parse_json(response, path)
+                except Exception as e:
+                    response = e
+                else:
+                    cache_store(key, payload, ttl_for(endpoint), storage, stale_ttl_for(endpoint))
+                    learn_identifiers(endpoint, item_id, payload, params, storage)
+                    response = CachedResponse(payload, from_cache=False)
+            for index in waiting[group]:
+                yield index, response
+    finally:
+        responses.close()
+
+
+# Maximum number of IDs accepted by the POST .../batch endpoints
+BATCH_LIMIT = 500
+
+
+class BatchResult:
+    """
+    Outcome of cached_batch. status_code stays 200 unless a request was
+    rejected with 401/402, in which case the lookup stopped early.
+    requested lists the IDs the result covers; IDs in requested but in
+    neither records nor failures were not found.
+    """
+
+    def __init__(self, requested: Optional[list[str]] = None):
+        self.status_code = 200
+        self.requested: list[str] = requested or []
+        self.records: dict[str, Any] = {}
+        self.failures: dict[str, tuple[str, str]] = {}
+
+
+def iter_batch(
+    endpoint: str,
+    path: str,
+    ids: list[str],
+    api_key: str,
+    fields: str,
+    timeout: float = DEFAULT_TIMEOUT,
+    chunk_size: int = BATCH_LIMIT,
+    max_concurrency: int = 4,
+) -> Iterator[BatchResult]:
+    """
+    Incremental form of cached_batch: yields a partial BatchResult for the
+    cached IDs first, then one per POSTed chunk as soon as it returns, in
+    completion order. A partial with a 401/402 status_code is the last one
+    yielded.
+
+    Batches use the in-process cache only: a lookup of up to BATCH_LIMIT
+    IDs would otherwise cost a storage round trip per stored ID, and as
+    many queued writes.
+    """
+    cached = BatchResult()
+    for item_id in dict.fromkeys(ids):
+        record = cache_lookup(make_key(endpoint, item_id, {"fields": fields}))
+        if record is not None:
+            cached.requested.append(item_id)
+            cached.records[item_id] = record
+    if cached.requested:
+        yield cached
+
+    missing = [i for i in dict.fromkeys(ids) if i not in cached.records]
+    chunk_size = max(1, min(chunk_size, BATCH_LIMIT))
+    chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+    specs = [("POST", path, {"fields": fields}, {"ids": chunk}) for chunk in chunks]
+
+    # Chunks are POSTed concurrently and reported as each one returns
+    responses = request_many(specs, api_key, timeout=timeout, max_concurrency=max_concurrency)
+    try:
+        for index, response in responses:
+            chunk = chunks[index]
+            part = BatchResult(chunk)
+            try:
+                if isinstance(response, Exception):
+                    raise response
+
+                if response.status_code in (401, 402):
+                    part.status_code = response.status_code
+                    yield part
+                    return
+                elif response.status_code != 200:
+                    for item_id in chunk:
+                        part.failures[item_id] = ("Error", f"API returned status {response.status_code}")
+                else:
+                    # The batch endpoint returns one entry per requested ID, in
+                    # order, with null for IDs it could not resolve
+                    for item_id, record in zip(chunk, parse_json(response, path)):
+                        if record is None:
+                            continue
+                        part.records[item_id] = record
+                        cache_store(make_key(endpoint, item_id, {"fields": fields}), record, ttl_for(endpoint))
+                        learn_identifiers(endpoint, item_id, record, {"fields": fields})
+
+            except BudgetExhausted as e:
+                for item_id in chunk:
+                    part.failures[item_id] = ("Truncated", f"ID: {item_id} ({e})")
+            except requests.exceptions.Timeout:
+                for item_id in chunk:
+                    part.failures[item_id] = ("Timeout", f"ID: {item_id}")
+            except Exception as e:
+                for item_id in chunk:
+                    part.failures[item_id] = ("Error", f"Error: {str(e)}")
+            yield part
+    finally:
+        responses.close()
+
+
+def cached_batch(
+    endpoint: str,
+    path: str,
+    ids: list[str],
+    api_key: str,
+    fields: str,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> BatchResult:
+    """
+    Resolve IDs through the in-process cache and POST only the misses to a batch
+    endpoint, BATCH_LIMIT at a time. IDs the endpoint returned null for end
+    up in neither records nor failures; chunks that failed are recorded per
+    ID as (label, detail) in failures.
+    """
+    result = BatchResult()
+    for part in iter_batch(endpoint, path, ids, api_key, fields, timeout=timeout):
+        result.requested.extend(part.requested)
+        result.records.update(part.records)
+        result.failures.update(part.failures)
+        result.status_code = part.status_code
+    return result
+
+
+def get_rate_limit_stats() -> dict:
+    return rate_limiter.stats()
+
+
+def get_coalescing_stats() -> dict:
+    return in_flight.stats()
+
+
+def get_revalidation_stats() -> dict:
+    return revalidator.stats()
+
+
+def get_pool_stats() -> dict:
+    """
+    Connection reuse counters for the shared pool
+    """
+    if _adapter is None:
+        return {"requests": 0, "connections_opened": 0, "connections_reused": 0, "reuse_ratio": 0.0}
+    sent, opened = _adapter.connection_stats()
+    reused = max(sent - opened, 0)
+    return {
+        "requests": sent,
+        "connections_opened": opened,
+        "connections_reused": reused,
+        "reuse_ratio": reused / sent if sent else 0.0,
+    }
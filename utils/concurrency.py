@@ -0,0 +1,27 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Iterator
+
+
+def fan_out(
+    func: Callable[[Any], Any], items: Iterable[Any], max_workers: int
+) -> Iterator[tuple[int, Any]]:
+    """
+    Run func over items on a bounded thread pool, yielding (index, result)
+    in completion order. Closing the iterator early cancels every call that
+    has not started yet, so callers can short-circuit on fatal errors.
+    Each call runs in a copy of the caller's context, so per-invocation
+    context (e.g. metrics) follows the work onto the pool.
+    """
+    items = list(items)
+    if not items:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    futures = {
+        executor.submit(contextvars.copy_context().run, func, item): i for i, item in enumerate(items)
+    }
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
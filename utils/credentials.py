@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+
+from utils.client import api_get, api_key_hash
+from utils.singleflight import SingleFlight
+
+
+# A paper known to exist; fetching only its paperId is the cheapest
+# authenticated request the API offers
+PROBE_PAPER_ID = os.environ.get("AI4S_PROBE_PAPER_ID", "649def34f8be52c8b66281af98ae884c09aef38b")
+PROBE_TIMEOUT = 10
+
+# Seconds a validation result is reused. Rejected keys are re-checked
+# sooner, and keys without credits sooner still, since a recharge fixes them.
+VALID_TTL = float(os.environ.get("AI4S_CREDENTIAL_TTL", "600"))
+INVALID_TTL = 60.0
+NO_CREDITS_TTL = 15.0
+
+
+class CredentialValidator:
+    """
+    Validates API keys with a one-field paper lookup and caches the outcome
+    per key hash, so repeated validations (workspace setup, several tool
+    nodes) cost at most one probe per TTL. Concurrent validations of the
+    same key share one probe. Timeouts and network or server errors are not
+    cached.
+    """
+
+    def __init__(self):
+        self._results: dict[str, tuple[float, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._in_flight = SingleFlight()
+        self.probes = 0
+        self.cache_hits = 0
+
+    def validate(self, api_key: str) -> None:
+        """
+        Return if the key is accepted, raise Exception with the reason if not
+        """
+        key = api_key_hash(api_key)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                error = cached[1]
+            else:
+                cached = None
+        if cached is None:
+            error = self._in_flight.do(key, lambda: self._probe(key, api_key))
+        if error:
+            raise Exception(error)
+
+    def _probe(self, key: str, api_key: str) -> Optional[str]:
+        with self._lock:
+            self.probes += 1
+        try:
+            response = api_get(
+                f"/graph/v1/paper/{PROBE_PAPER_ID}",
+                api_key,
+                params={"fields": "paperId"},
+                timeout=PROBE_TIMEOUT
+            )
+        except requests.exceptions.Timeout:
+            raise Exception("API request timeout")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Network error: {str(e)}")
+
+        # A 404 still means the key was accepted
+        if response.status_code in (200, 404):
+            self._remember(key, None, VALID_TTL)
+            return None
+        elif response.status_code == 401:
+            return self._remember(key, "Invalid API key", INVALID_TTL)
+        elif response.status_code == 402:
+            return self._remember(key, "Insufficient credits. Please recharge at ai4scholar.net", NO_CREDITS_TTL)
+        raise Exception(f"API error: {response.status_code}")
+
+    def _remember(self, key: str, error: Optional[str], ttl: float) -> Optional[str]:
+        with self._lock:
+            now = time.monotonic()
+            self._results[key] = (now + ttl, error)
+            # Drop expired results so the map only holds recently used keys
+            for stale in [k for k, (expires_at, _) in self._results.items() if expires_at <= now]:
+                del self._results[stale]
+        return error
+
+    def forget(self, api_key: str) -> None:
+        with self._lock:
+            self._results.pop(api_key_hash(api_key), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_keys": len(self._results),
+                "probes": self.probes,
+                "cache_hits": self.cache_hits,
+            }
+
+
+credential_validator = CredentialValidator()
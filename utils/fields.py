@@ -0,0 +1,27 @@
+from typing import Any
+
+
+DETAIL_LEVELS = ("compact", "standard", "full")
+DEFAULT_DETAIL_LEVEL = "standard"
+
+
+def get_detail_level(tool_parameters: dict[str, Any]) -> str:
+    level = str(tool_parameters.get("detail_level") or DEFAULT_DETAIL_LEVEL).strip().lower()
+    return level if level in DETAIL_LEVELS else DEFAULT_DETAIL_LEVEL
+
+
+def resolve_fields(field_sets: dict[str, list[str]], level: str) -> list[str]:
+    """
+    Field sets are declared per level and are cumulative: "standard" also
+    requests the "compact" fields, "full" requests all three.
+    """
+    fields: list[str] = []
+    for name in DETAIL_LEVELS[:DETAIL_LEVELS.index(level) + 1]:
+        for field in field_sets.get(name, []):
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def fields_param(field_sets: dict[str, list[str]], level: str) -> str:
+    return ",".join(resolve_fields(field_sets, level))
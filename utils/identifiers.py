@@ -0,0 +1,210 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from urllib.parse import unquote
+
+
+INDEX_MAX_PAPERS = int(os.environ.get("AI4S_ID_INDEX_MAX_PAPERS", "20000"))
+
+# externalIds keys -> the prefix the Graph API accepts in place of a paperId
+EXTERNAL_ID_PREFIXES = {
+    "DOI": "DOI",
+    "ArXiv": "ARXIV",
+    "PubMed": "PMID",
+    "PubMedCentral": "PMCID",
+    "CorpusId": "CorpusId",
+    "MAG": "MAG",
+    "ACL": "ACL",
+}
+
+_PREFIXES = {
+    "doi": "DOI",
+    "arxiv": "ARXIV",
+    "pmid": "PMID",
+    "pubmed": "PMID",
+    "pmcid": "PMCID",
+    "corpusid": "CorpusId",
+    "mag": "MAG",
+    "acl": "ACL",
+    "url": "URL",
+}
+
+_PAPER_ID = re.compile(r"[0-9a-f]{40}")
+_DOI = re.compile(r"10\.\d{4,9}/\S+")
+_ARXIV_NEW = re.compile(r"\d{4}\.\d{4,5}")
+_ARXIV_OLD = re.compile(r"[a-z\-]+(\.[A-Z]{2})?/\d{7}")
+_ARXIV_VERSION = re.compile(r"v\d+$")
+
+_URL_PATTERNS = [
+    (re.compile(r"(?:dx\.)?doi\.org/(10\.\d{4,9}/.+)", re.I), "DOI"),
+    (re.compile(r"arxiv\.org/(?:abs|pdf)/(.+?)(?:\.pdf)?/?$", re.I), "ARXIV"),
+    (re.compile(r"pubmed\.ncbi\.nlm\.nih\.gov/(\d+)", re.I), "PMID"),
+    (re.compile(r"ncbi\.nlm\.nih\.gov/pmc/articles/(PMC\d+)", re.I), "PMCID"),
+    (re.compile(r"aclanthology\.org/([^/?#]+?)(?:\.pdf)?/?$", re.I), "ACL"),
+    (re.compile(r"semanticscholar\.org/(?:paper/(?:[^/]+/)?|p/)([0-9a-f]{40})", re.I), None),
+    (re.compile(r"semanticscholar\.org/CorpusI[Dd]:(\d+)", re.I), "CorpusId"),
+]
+
+
+def _format(prefix: str, value: str) -> str:
+    value = value.strip()
+    if prefix == "DOI":
+        # DOIs are case-insensitive
+        return f"DOI:{value.lower()}"
+    if prefix == "ARXIV":
+        return f"ARXIV:{_ARXIV_VERSION.sub('', value)}"
+    return f"{prefix}:{value}"
+
+
+def normalize_paper_id(raw: str) -> str:
+    """
+    Normalize any accepted paper identifier to the form the Graph API
+    takes: a 40-hex paperId, or PREFIX:value for DOI, ARXIV, PMID, PMCID,
+    CorpusId, MAG and ACL. doi.org, arxiv.org, PubMed, ACL Anthology and
+    Semantic Scholar URLs are unwrapped, and bare DOIs and arXiv IDs are
+    recognised. Anything else is returned stripped but unchanged.
+    """
+    value = unquote((raw or "").strip())
+    if not value:
+        return value
+
+    if _PAPER_ID.fullmatch(value.lower()):
+        return value.lower()
+
+    if "://" in value or value.lower().startswith(("doi.org/", "arxiv.org/", "www.")):
+        for pattern, prefix in _URL_PATTERNS:
+            match = pattern.search(value)
+            if match:
+                if prefix is None:
+                    return match.group(1).lower()
+                return _format(prefix, match.group(1))
+        return f"URL:{value}"
+
+    prefix, sep, rest = value.partition(":")
+    if sep and prefix.lower() in _PREFIXES:
+        canonical = _PREFIXES[prefix.lower()]
+        if canonical == "URL":
+            return f"URL:{rest.strip()}"
+        return _format(canonical, rest)
+
+    if _DOI.fullmatch(value):
+        return _format("DOI", value)
+    if _ARXIV_NEW.fullmatch(_ARXIV_VERSION.sub("", value)) or _ARXIV_OLD.fullmatch(value):
+        return _format("ARXIV", value)
+    return value
+
+
+def is_paper_identifier(raw: str) -> bool:
+    """
+    Whether raw is something normalize_paper_id understands (a paperId, a
+    prefixed or bare external ID, or a supported URL) rather than free
+    text such as a title
+    """
+    normalized = normalize_paper_id(raw)
+    if _PAPER_ID.fullmatch(normalized):
+        return True
+    prefix, sep, value = normalized.partition(":")
+    return bool(sep) and bool(value) and prefix in _PREFIXES.values()
+
+
+class IdentifierIndex:
+    """
+    Bidirectional, bounded map between external identifiers and paperIds.
+    Filled from every externalIds payload the client sees, so an ID a tool
+    was given resolves to its paperId without a round trip.
+    """
+
+    def __init__(self, max_papers: int):
+        self.max_papers = max_papers
+        self._to_paper: dict[str, str] = {}
+        self._aliases: OrderedDict[str, set[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.resolved = 0
+        self.unresolved = 0
+
+    def resolve(self, normalized: str) -> Optional[str]:
+        with self._lock:
+            paper_id = self._to_paper.get(normalized)
+            if paper_id is None:
+                self.unresolved += 1
+                return None
+            self._aliases.move_to_end(paper_id)
+            self.resolved += 1
+            return paper_id
+
+    def aliases(self, paper_id: str) -> list[str]:
+        with self._lock:
+            return sorted(self._aliases.get(paper_id, ()))
+
+    def add(self, alias: str, paper_id: str) -> None:
+        if not alias or not paper_id or alias == paper_id:
+            return
+        with self._lock:
+            previous = self._to_paper.get(alias)
+            if previous == paper_id:
+                return
+            if previous is not None and previous in self._aliases:
+                self._aliases[previous].discard(alias)
+            self._to_paper[alias] = paper_id
+            self._aliases.setdefault(paper_id, set()).add(alias)
+            self._aliases.move_to_end(paper_id)
+            while len(self._aliases) > self.max_papers:
+                _, evicted = self._aliases.popitem(last=False)
+                for old in evicted:
+                    self._to_paper.pop(old, None)
+
+    def learn(self, paper: dict) -> None:
+        """
+        Record every external ID of one paper record
+        """
+        paper_id = paper.get("paperId")
+        external_ids = paper.get("externalIds")
+        if not paper_id or not isinstance(external_ids, dict):
+            return
+        for key, prefix in EXTERNAL_ID_PREFIXES.items():
+            value = external_ids.get(key)
+            if value:
+                self.add(_format(prefix, str(value)), paper_id)
+
+    def learn_payload(self, payload: Any, depth: int = 0) -> None:
+        """
+        Walk an API payload (paper, batch list, search or citation page)
+        and learn from every paper record in it that carries externalIds
+        """
+        if depth > 3:
+            return
+        if isinstance(payload, list):
+            for item in payload:
+                if isinstance(item, (dict, list)):
+                    self.learn_payload(item, depth + 1)
+        elif isinstance(payload, dict):
+            if "externalIds" in payload:
+                self.learn(payload)
+            for value in payload.values():
+                if isinstance(value, (dict, list)):
+                    self.learn_payload(value, depth + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "papers": len(self._aliases),
+                "aliases": len(self._to_paper),
+                "resolved": self.resolved,
+                "unresolved": self.unresolved,
+            }
+
+
+id_index = IdentifierIndex(INDEX_MAX_PAPERS)
+
+
+def canonical_paper_id(raw: str) -> str:
+    """
+    The ID tools should use in request paths and cache keys: the paperId
+    when the index knows it, otherwise the normalized identifier
+    """
+    normalized = normalize_paper_id(raw)
+    if _PAPER_ID.fullmatch(normalized):
+        return normalized
+    return id_index.resolve(normalized) or normalized
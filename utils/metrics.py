@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Optional
+
+from utils.persistent_cache import persistent_cache
+
+
+# Set AI4S_METRICS=0 to turn instrumentation off; tools then only drain
+# their storage writes and the client skips every timer
+METRICS_ENABLED = os.environ.get("AI4S_METRICS", "1").lower() not in ("0", "false", "no", "off")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process registry of labelled histograms and counters. Series are
+    keyed by (name, sorted label items) and created on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, float] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def observe(self, name: str, value: float, buckets: tuple = SECONDS_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Count and sum per histogram series, and counter values, keyed by
+        the series name as it appears in the Prometheus output
+        """
+        with self._lock:
+            histograms = {
+                _series(name, labels): {"count": h.count, "sum": h.sum}
+                for (name, labels), h in self._histograms.items()
+            }
+            counters = {_series(name, labels): value for (name, labels), value in self._counters.items()}
+        return {"histograms": histograms, "counters": counters}
+
+    def render(self, gauges: Optional[dict[str, float]] = None, totals: Optional[dict[str, float]] = None) -> str:
+        """
+        Render every series in the Prometheus text exposition format.
+        gauges adds point-in-time values (e.g. cache sizes) by name, and
+        totals adds cumulative counts kept elsewhere (names end in _total).
+        """
+        with self._lock:
+            histograms = sorted(
+                (key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            )
+            counters = sorted(self._counters.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name: str, kind: str) -> None:
+            if name in declared:
+                return
+            declared.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), buckets, counts, total, count in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + [float("inf")], counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{_series(name + '_bucket', labels + (('le', le),))} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {total}")
+            lines.append(f"{_series(name + '_count', labels)} {count}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{_series(name, labels)} {value}")
+
+        for name, value in sorted((totals or {}).items()):
+            declare(name, "counter")
+            lines.append(f"{name} {value}")
+
+        for name, value in sorted((gauges or {}).items()):
+            declare(name, "gauge")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _series(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+    return f"{name}{{{rendered}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+registry.describe("ai4s_tool_seconds", "Tool invocation time by phase (total, first_message, upstream, format)")
+registry.describe("ai4s_tool_output_bytes", "Bytes of text, JSON and blob output per tool invocation")
+registry.describe("ai4s_tool_invocations_total", "Tool invocations by outcome")
+registry.describe("ai4s_upstream_seconds", "Upstream API time by phase (queue, ttfb, download, parse)")
+registry.describe("ai4s_upstream_response_bytes", "Upstream response body size")
+registry.describe("ai4s_upstream_responses_total", "Upstream responses by status code")
+
+
+# Upstream paths are reported with their IDs replaced so label cardinality
+# stays bounded
+_STATIC_SEGMENTS = {
+    "graph", "v1", "paper", "papers", "author", "search", "batch", "match", "bulk",
+    "citations", "references", "recommendations", "forpaper",
+}
+
+
+def endpoint_label(path: str) -> str:
+    labelled = []
+    for segment in path.split("?", 1)[0].strip("/").split("/"):
+        segment = segment if segment in _STATIC_SEGMENTS else "{id}"
+        # DOIs contain slashes; keep one placeholder per ID
+        if segment != "{id}" or not labelled or labelled[-1] != "{id}":
+            labelled.append(segment)
+    return "/" + "/".join(labelled)
+
+
+class InvocationStats:
+    """
+    Per-invocation accumulator for the wall time spent waiting on upstream
+    requests. Overlapping requests (fan-out, prefetch) are counted once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._since = 0.0
+        self.upstream = 0.0
+
+    def begin(self) -> None:
+        with self._lock:
+            if self._active == 0:
+                self._since = time.perf_counter()
+            self._active += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.upstream += time.perf_counter() - self._since
+
+
+_current: contextvars.ContextVar[Optional[InvocationStats]] = contextvars.ContextVar("ai4s_invocation", default=None)
+
+
+def current_invocation() -> Optional[InvocationStats]:
+    return _current.get()
+
+
+def _message_size(message: Any) -> int:
+    inner = getattr(message, "message", None)
+    text = getattr(inner, "text", None)
+    if isinstance(text, str):
+        return len(text.encode("utf-8"))
+    blob = getattr(inner, "blob", None)
+    if isinstance(blob, (bytes, bytearray)):
+        return len(blob)
+    json_object = getattr(inner, "json_object", None)
+    if json_object is not None:
+        return len(json.dumps(json_object, ensure_ascii=False, default=str).encode("utf-8"))
+    return 0
+
+
+def _is_error(message: Any) -> bool:
+    text = getattr(getattr(message, "message", None), "text", None)
+    return isinstance(text, str) and text.startswith("Error:")
+
+
+def _session_storage(tool) -> Any:
+    return getattr(getattr(tool, "session", None), "storage", None)
+
+
+def instrumented(invoke: Callable) -> Callable:
+    """
+    Decorator for Tool._invoke recording total time, time to first message,
+    upstream wait, local processing (formatting) time, output bytes and
+    outcome per tool. Either way, the writes the tool queued for its session
+    storage are stored before the invocation finishes.
+    """
+    if not METRICS_ENABLED:
+        @functools.wraps(invoke)
+        def drained(self, tool_parameters: dict[str, Any]):
+            try:
+                yield from invoke(self, tool_parameters)
+            finally:
+                persistent_cache.drain(_session_storage(self))
+
+        return drained
+
+    tool = invoke.__module__.rsplit(".", 1)[-1]
+
+    @functools.wraps(invoke)
+    def wrapper(self, tool_parameters: dict[str, Any]):
+        stats = InvocationStats()
+        generator = invoke(self, tool_parameters)
+        start = time.perf_counter()
+        busy = 0.0
+        first_message = None
+        output_bytes = 0
+        outcome = "ok"
+        try:
+            while True:
+                # The invocation context is only active while the tool runs,
+                # so interleaved generators never see each other's stats
+                token = _current.set(stats)
+                resumed = time.perf_counter()
+                try:
+                    message = next(generator)
+                except StopIteration:
+                    break
+                finally:
+                    busy += time.perf_counter() - resumed
+                    _current.reset(token)
+                if first_message is None:
+                    first_message = time.perf_counter() - start
+                output_bytes += _message_size(message)
+                if _is_error(message):
+                    outcome = "error"
+                yield message
+        except GeneratorExit:
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "exception"
+            raise
+        finally:
+            generator.close()
+            persistent_cache.drain(_session_storage(self))
+            registry.observe("ai4s_tool_seconds", time.perf_counter() - start, tool=tool, phase="total")
+            if first_message is not None:
+                registry.observe("ai4s_tool_seconds", first_message, tool=tool, phase="first_message")
+            registry.observe("ai4s_tool_seconds", stats.upstream, tool=tool, phase="upstream")
+            registry.observe("ai4s_tool_seconds", max(busy - stats.upstream, 0.0), tool=tool, phase="format")
+            registry.observe("ai4s_tool_output_bytes", output_bytes, buckets=BYTES_BUCKETS, tool=tool)
+            registry.inc("ai4s_tool_invocations_total", tool=tool, outcome=outcome)
+
+    return wrapper
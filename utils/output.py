@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import re
+import tempfile
+from typing import Any, Optional
+
+
+OUTPUT_FORMATS = ("markdown", "json", "both")
+DEFAULT_OUTPUT_FORMAT = "markdown"
+
+# File export formats -> MIME type of the blob message
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Exports larger than this are spooled to a temporary file until sent
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+
+def get_output_format(tool_parameters: dict[str, Any]) -> str:
+    value = str(tool_parameters.get("output_format") or DEFAULT_OUTPUT_FORMAT).strip().lower()
+    return value if value in OUTPUT_FORMATS else DEFAULT_OUTPUT_FORMAT
+
+
+def wants_json(output_format: str) -> bool:
+    return output_format in ("json", "both")
+
+
+def wants_markdown(output_format: str) -> bool:
+    return output_format in ("markdown", "both")
+
+
+def get_export_format(tool_parameters: dict[str, Any]) -> Optional[str]:
+    value = str(tool_parameters.get("export_format") or "").strip().lower()
+    return value if value in EXPORT_FORMATS else None
+
+
+# API field -> normalized key, for fields copied through unchanged
+_PAPER_FIELDS = {
+    "paperId": "paper_id",
+    "title": "title",
+    "year": "year",
+    "venue": "venue",
+    "publicationDate": "publication_date",
+    "citationCount": "citation_count",
+    "influentialCitationCount": "influential_citation_count",
+    "referenceCount": "reference_count",
+    "abstract": "abstract",
+    "fieldsOfStudy": "fields_of_study",
+    "publicationTypes": "publication_types",
+}
+
+_AUTHOR_FIELDS = {
+    "authorId": "author_id",
+    "name": "name",
+    "affiliations": "affiliations",
+    "paperCount": "paper_count",
+    "citationCount": "citation_count",
+    "hIndex": "h_index",
+    "homepage": "homepage",
+}
+
+
+def normalize_paper(paper: dict) -> dict:
+    """
+    Flatten an API paper record into the plugin's JSON schema. Only fields
+    present in the response are emitted, so the projection requested from
+    the API carries through to the output.
+    """
+    record = {key: paper[field] for field, key in _PAPER_FIELDS.items() if field in paper}
+    if "authors" in paper:
+        record["authors"] = [a.get("name", "") for a in paper.get("authors") or []]
+    if "externalIds" in paper:
+        external_ids = paper.get("externalIds") or {}
+        record["doi"] = external_ids.get("DOI")
+        record["arxiv_id"] = external_ids.get("ArXiv")
+    if "openAccessPdf" in paper:
+        open_access = paper.get("openAccessPdf") or {}
+        record["pdf_url"] = open_access.get("url") or None
+    if "tldr" in paper:
+        tldr = paper.get("tldr") or {}
+        record["tldr"] = tldr.get("text") or None
+    return record
+
+
+def normalize_author(author: dict) -> dict:
+    record = {key: author[field] for field, key in _AUTHOR_FIELDS.items() if field in author}
+    if "externalIds" in author:
+        external_ids = author.get("externalIds") or {}
+        record["orcid"] = external_ids.get("ORCID")
+        record["dblp"] = external_ids.get("DBLP")
+    return record
+
+
+# Preferred CSV column order; columns follow the fields actually fetched
+_EXPORT_COLUMNS = [
+    "paper_id", "title", "year", "publication_date", "venue", "citation_count",
+    "influential_citation_count", "reference_count", "authors", "doi", "arxiv_id",
+    "pdf_url", "fields_of_study", "publication_types", "tldr", "abstract",
+]
+
+
+class PaperExport:
+    """
+    Normalized paper records written as JSON lines or CSV, page by page,
+    into a spooled temporary file: only the encoded rows are kept, and
+    past EXPORT_SPOOL_BYTES they move to disk until the file is sent
+    """
+
+    def __init__(self, export_format: str, name: str):
+        self.export_format = export_format
+        self.mime_type = EXPORT_FORMATS[export_format]
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")[:60] or "papers"
+        self.filename = f"{slug}.{export_format}"
+        self.rows = 0
+        self._columns: Optional[list[str]] = None
+        self._file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+
+    def write(self, papers: list[dict]) -> None:
+        records = [normalize_paper(p) for p in papers]
+        if not records:
+            return
+        buffer = io.StringIO()
+        if self.export_format == "jsonl":
+            for record in records:
+                buffer.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+                buffer.write("\n")
+        else:
+            writer = csv.writer(buffer)
+            if self._columns is None:
+                present = set().union(*records)
+                self._columns = [c for c in _EXPORT_COLUMNS if c in present]
+                self._columns += sorted(present - set(self._columns))
+                writer.writerow(self._columns)
+            for record in records:
+                writer.writerow([_csv_value(record.get(column)) for column in self._columns])
+        self._file.write(buffer.getvalue().encode("utf-8"))
+        self.rows += len(records)
+
+    def getvalue(self) -> bytes:
+        self._file.seek(0)
+        return self._file.read()
+
+    def meta(self) -> dict:
+        return {"mime_type": self.mime_type, "filename": self.filename}
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "; ".join(str(v) for v in value)
+    return value
@@ -0,0 +1,214 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+from utils.budget import BudgetExhausted, truncation_reason
+from utils.output import normalize_paper, wants_json, wants_markdown
+
+
+# Rows per upstream request, and hard caps on what one invocation may return
+PAGE_SIZE = 100
+MAX_ROWS = 1000
+MAX_BYTES = 512 * 1024
+
+
+def iter_pages(
+    fetch_page: Callable[[int, int], Any], limit: int, page_size: int = PAGE_SIZE, prefetch: bool = True
+) -> Iterator[tuple[Any, list]]:
+    """
+    Walk an offset/next paginated endpoint, yielding (response, rows) per
+    page until limit rows were returned or the endpoint has no next page.
+    fetch_page(offset, size) must return a response-like object. A non-200
+    response is yielded once with no rows and ends the walk.
+
+    With prefetch, the next page is requested in the background while the
+    caller is still formatting the current one.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pending = None
+    offset = 0
+    remaining = min(limit, MAX_ROWS)
+    try:
+        while remaining > 0:
+            if pending is not None:
+                response = pending.result()
+                pending = None
+            else:
+                response = fetch_page(offset, min(page_size, remaining))
+
+            if response.status_code != 200:
+                yield response, []
+                return
+
+            data = response.json()
+            rows = data.get("data", [])[:remaining]
+            remaining -= len(rows)
+            next_offset = data.get("next")
+            has_more = bool(rows) and next_offset is not None and remaining > 0
+
+            if has_more and executor is not None:
+                pending = executor.submit(
+                    contextvars.copy_context().run, fetch_page, next_offset, min(page_size, remaining)
+                )
+
+            yield response, rows
+
+            if not has_more:
+                return
+            offset = next_offset
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_linked_papers(
+    tool: Any,
+    fetch_page: Callable[[int, int], Any],
+    limit: int,
+    output_format: str,
+    paper_id: str,
+    item_key: str,
+    heading: str,
+    noun: str,
+) -> Iterator[Any]:
+    """
+    Walk a citations/references listing with iter_pages and yield the
+    tool's messages page by page: a JSON message and/or a Markdown block
+    per page, under the MAX_BYTES cap, with a truncation note if the
+    invocation budget runs out. paper_id is shown as the user gave it;
+    item_key is "citingPaper" or "citedPaper", noun "citations" or
+    "references". Network errors propagate to the tool's handlers.
+    """
+    shown = 0
+    sent_bytes = 0
+    paginated = limit > PAGE_SIZE
+
+    try:
+        # Each page is streamed as its own message while the next page
+        # is prefetched
+        for response, items in iter_pages(fetch_page, limit):
+            if response.status_code == 401:
+                yield tool.create_text_message("Error: Invalid API key")
+                return
+            elif response.status_code == 402:
+                yield tool.create_text_message("Error: Insufficient credits. Please recharge at ai4scholar.net")
+                return
+            elif response.status_code == 404:
+                yield tool.create_text_message(f"Error: Paper not found with ID: {paper_id}")
+                return
+            elif response.status_code != 200:
+                yield tool.create_text_message(f"Error: API returned status {response.status_code}")
+                return
+
+            if not items:
+                break
+
+            if wants_json(output_format):
+                yield tool.create_json_message({
+                    "paper_id": paper_id,
+                    "offset": shown,
+                    "papers": [normalize_paper(item.get(item_key, {})) for item in items]
+                })
+            if not wants_markdown(output_format):
+                shown += len(items)
+                continue
+
+            if shown == 0:
+                if paginated:
+                    result_lines = [f"# {heading}\n**Paper ID:** {paper_id} | **Requested:** up to {limit} {noun}\n"]
+                else:
+                    result_lines = [f"# {heading}\n**Paper ID:** {paper_id} | **Showing:** {len(items)} {noun}\n"]
+            else:
+                result_lines = []
+
+            for i, item in enumerate(items, shown + 1):
+                paper = item.get(item_key, {})
+                title = paper.get("title", "N/A")
+                authors = ", ".join([a.get("name", "") for a in paper.get("authors", [])[:3]])
+                if len(paper.get("authors", [])) > 3:
+                    authors += " et al."
+                year = paper.get("year", "N/A")
+                cite_count = paper.get("citationCount", 0)
+                venue = paper.get("venue", "")
+
+                result_lines.append(f"### {i}. {title}")
+                result_lines.append(f"**Authors:** {authors}")
+                result_lines.append(f"**Year:** {year} | **Citations:** {cite_count}")
+                if venue:
+                    result_lines.append(f"**Venue:** {venue}")
+                result_lines.append(f"**Paper ID:** {paper.get('paperId', '')}")
+                result_lines.append("")
+
+            shown += len(items)
+            text = "\n".join(result_lines)
+            sent_bytes += len(text.encode("utf-8"))
+            yield tool.create_text_message(text)
+
+            if sent_bytes >= MAX_BYTES:
+                yield tool.create_text_message(f"\n_Output truncated at {shown} {noun} (size limit reached)._")
+                return
+
+        if shown == 0:
+            if wants_markdown(output_format):
+                yield tool.create_text_message(f"No {noun} found for paper: {paper_id}")
+            else:
+                yield tool.create_json_message({"paper_id": paper_id, "offset": 0, "papers": []})
+        elif paginated and wants_markdown(output_format):
+            yield tool.create_text_message(f"\n**Total shown:** {shown} {noun}")
+
+    except BudgetExhausted:
+        # Pages already sent stand; report where the walk stopped
+        truncated = truncation_reason()
+        if wants_json(output_format):
+            yield tool.create_json_message({"paper_id": paper_id, "offset": shown, "papers": [], "truncated": truncated})
+        if wants_markdown(output_format):
+            yield tool.create_text_message(f"\n_Output truncated at {shown} {noun} ({truncated} reached)._")
+
+
+def iter_token_pages(
+    fetch_page: Callable[[Optional[str]], Any], limit: int, prefetch: bool = True
+) -> Iterator[tuple[Any, dict]]:
+    """
+    Walk a continuation-token paginated endpoint (search/bulk), yielding
+    (response, page) per page until limit rows were returned or a page
+    carries no token. page is the parsed body with its "data" trimmed to
+    the rows still wanted. fetch_page(token) is called with None for the
+    first page. A non-200 response is yielded once with an empty page and
+    ends the walk.
+
+    Only the current page and one prefetched page are held at a time, so
+    memory does not grow with the number of pages walked.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pending = None
+    token = None
+    remaining = limit
+    try:
+        while remaining > 0:
+            if pending is not None:
+                response = pending.result()
+                pending = None
+            else:
+                response = fetch_page(token)
+
+            if response.status_code != 200:
+                yield response, {}
+                return
+
+            page = response.json()
+            rows = page.get("data") or []
+            token = page.get("token")
+            has_more = bool(rows) and bool(token) and remaining > len(rows)
+            page["data"] = rows[:remaining]
+            remaining -= len(page["data"])
+
+            if has_more and executor is not None:
+                pending = executor.submit(contextvars.copy_context().run, fetch_page, token)
+
+            yield response, page
+
+            if not has_more:
+                return
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
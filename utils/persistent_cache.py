@@ -0,0 +1,346 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# Plugin storage quota is 10 MB (manifest.yaml); keep headroom for the index
+STORAGE_BUDGET_BYTES = int(os.environ.get("AI4S_STORAGE_CACHE_BYTES", str(8 * 1024 * 1024)))
+WRITE_QUEUE_SIZE = 1024
+# Longest a finishing invocation waits for its queued writes; the session
+# storage is only usable while the tool runs, so later writes are dropped
+DRAIN_TIMEOUT = float(os.environ.get("AI4S_STORAGE_DRAIN_SECONDS", "2"))
+
+INDEX_KEY = "ai4s-cache-index"
+# Random ID stored once per tenant storage; the SDK does not expose the tenant
+TENANT_KEY = "ai4s-cache-tenant"
+KEY_PREFIX = "ai4s-c-"
+
+
+def encode(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+def decode(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def storage_key(key: Hashable) -> str:
+    return KEY_PREFIX + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+class _StorageWrites:
+    """
+    Writes queued for one storage object and not yet stored
+    """
+
+    __slots__ = ("storage", "count", "cancelled", "idle")
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.count = 0
+        self.cancelled = False
+        self.idle = threading.Event()
+
+
+class PersistentCache:
+    """
+    Second cache tier on the Dify plugin storage API, so restarted processes
+    and scale-out replicas start warm.
+
+    Entries are zlib-compressed JSON with a wall-clock expiry and, for
+    stale-while-revalidate endpoints, the earlier time they turn stale. An
+    index of stored keys (size, expiry), kept in LRU order, lets lookups skip
+    storage round trips for keys we know are absent and drives eviction to
+    stay under the storage budget. Plugin storage is scoped per tenant, so
+    each tenant has its own index and budget, found through the ID stored
+    under TENANT_KEY in its storage. Writes are queued and flushed by a
+    background thread, so requests never wait on storage; an invocation
+    drains its own writes before it finishes, while its storage is valid.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Tenant ID -> that tenant's index, loaded on first use
+        self._indexes: dict[str, OrderedDict[str, tuple[int, float]]] = {}
+        # Storage object -> tenant ID, so the ID is read once per session
+        self._tenants: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._worker: Optional[threading.Thread] = None
+        # Keyed by id(storage); an entry holds its storage until drained
+        self._pending: dict[int, _StorageWrites] = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.write_errors = 0
+        self.dropped_writes = 0
+        self.evictions = 0
+
+    def get(self, storage, key: Hashable) -> Optional[tuple[Any, float, float]]:
+        """
+        Return (payload, remaining_ttl, remaining_stale_ttl) or None.
+        remaining_ttl is negative once the entry is stale.
+        """
+        if storage is None or self.max_bytes <= 0:
+            return None
+        index = self._index_for(storage)
+        skey = storage_key(key)
+        now = time.time()
+        with self._lock:
+            entry = index.get(skey) if index is not None else None
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+        try:
+            envelope = decode(storage.get(skey))
+        except Exception:
+            with self._lock:
+                index.pop(skey, None)
+                self.misses += 1
+            return None
+        remaining = envelope["e"] - now
+        if remaining <= 0:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            if skey in index:
+                index.move_to_end(skey)
+            self.hits += 1
+        return envelope["v"], envelope.get("s", envelope["e"]) - now, remaining
+
+    def put(self, storage, key: Hashable, payload: Any, ttl: float, stale_ttl: float = 0) -> None:
+        """
+        Queue a write-behind store; never blocks the caller
+        """
+        if storage is None or self.max_bytes <= 0:
+            return
+        fresh_until = time.time() + ttl
+        with self._lock:
+            writes = self._pending.get(id(storage))
+            if writes is None:
+                writes = self._pending[id(storage)] = _StorageWrites(storage)
+            writes.count += 1
+        try:
+            self._queue.put_nowait((writes, storage_key(key), payload, fresh_until, fresh_until + max(stale_ttl, 0)))
+        except queue.Full:
+            self._done(writes, 1)
+            with self._lock:
+                self.dropped_writes += 1
+            return
+        self._ensure_worker()
+
+    def drain(self, storage, timeout: float = DRAIN_TIMEOUT) -> None:
+        """
+        Wait until the writes queued for storage are stored. Writes still
+        queued after timeout are dropped rather than sent through a storage
+        object whose invocation has ended.
+        """
+        if storage is None:
+            return
+        with self._lock:
+            writes = self._pending.get(id(storage))
+        if writes is None or writes.idle.wait(timeout):
+            return
+        with self._lock:
+            writes.cancelled = True
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Block until queued writes are stored (used by benchmarks and shutdown)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tenants": len(self._indexes),
+                "entries": sum(len(index) for index in self._indexes.values()),
+                "bytes": sum(size for index in self._indexes.values() for size, _ in index.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "write_errors": self.write_errors,
+                "dropped_writes": self.dropped_writes,
+                "evictions": self.evictions,
+                "pending_writes": self._queue.qsize(),
+            }
+
+    def _index_for(self, storage) -> Optional[OrderedDict]:
+        """
+        The index of the tenant storage belongs to, loaded on first use; None
+        when the tenant cannot be told, in which case storage is not used
+        """
+        tenant = self._tenant(storage)
+        if tenant is None:
+            return None
+        with self._lock:
+            index = self._indexes.get(tenant)
+        if index is not None:
+            return index
+        stored = self._read_index(storage)
+        with self._lock:
+            if tenant not in self._indexes:
+                self._indexes[tenant] = OrderedDict(stored)
+            return self._indexes[tenant]
+
+    def _tenant(self, storage) -> Optional[str]:
+        try:
+            tenant = self._tenants.get(storage)
+        except TypeError:
+            tenant = None
+        if tenant is not None:
+            return tenant
+        try:
+            tenant = storage.get(TENANT_KEY).decode("utf-8")
+        except Exception:
+            # A missing key and a failed read raise alike; only create the
+            # ID when the key is known to be absent
+            try:
+                if storage.exist(TENANT_KEY):
+                    return None
+                tenant = uuid.uuid4().hex
+                storage.set(TENANT_KEY, tenant.encode("utf-8"))
+            except Exception:
+                return None
+        try:
+            self._tenants[storage] = tenant
+        except TypeError:
+            pass
+        return tenant
+
+    def _read_index(self, storage) -> dict:
+        try:
+            if not storage.exist(INDEX_KEY):
+                return {}
+            return {k: (v[0], v[1]) for k, v in decode(storage.get(INDEX_KEY)).items()}
+        except Exception:
+            return {}
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="ai4s-storage-writer", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is queued so the index is written once per batch
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Each storage object gets its own entries and index write
+            groups: dict[int, list] = {}
+            for entry in batch:
+                groups.setdefault(id(entry[0]), []).append(entry)
+            for entries in groups.values():
+                writes = entries[0][0]
+                try:
+                    if not writes.cancelled:
+                        self._write_batch(writes, entries)
+                    else:
+                        with self._lock:
+                            self.dropped_writes += len(entries)
+                except Exception:
+                    with self._lock:
+                        self.write_errors += 1
+                finally:
+                    self._done(writes, len(entries))
+            for _ in batch:
+                self._queue.task_done()
+
+    def _done(self, writes: _StorageWrites, count: int) -> None:
+        with self._lock:
+            writes.count -= count
+            if writes.count <= 0:
+                if self._pending.get(id(writes.storage)) is writes:
+                    del self._pending[id(writes.storage)]
+                writes.idle.set()
+
+    def _write_batch(self, writes: _StorageWrites, batch: list) -> None:
+        storage = writes.storage
+        index = self._index_for(storage)
+        if index is None:
+            with self._lock:
+                self.dropped_writes += len(batch)
+            return
+        for _, skey, payload, fresh_until, expires_at in batch:
+            if writes.cancelled:
+                with self._lock:
+                    self.dropped_writes += 1
+                continue
+            blob = encode({"e": expires_at, "s": fresh_until, "v": payload})
+            if len(blob) > self.max_bytes:
+                continue
+            try:
+                storage.set(skey, blob)
+            except Exception:
+                with self._lock:
+                    self.write_errors += 1
+                continue
+            with self._lock:
+                index[skey] = (len(blob), expires_at)
+                index.move_to_end(skey)
+                self.writes += 1
+        if writes.cancelled:
+            # The next drained batch stores the index with these keys
+            return
+
+        # Merge keys other replicas may have written since we loaded the
+        # index, so their entries are still accounted for and evictable
+        for skey, entry in self._read_index(storage).items():
+            with self._lock:
+                if skey not in index:
+                    index[skey] = entry
+                    index.move_to_end(skey, last=False)
+
+        for skey in self._select_evictions(index):
+            try:
+                storage.delete(skey)
+            except Exception:
+                pass
+
+        with self._lock:
+            snapshot = {k: list(v) for k, v in index.items()}
+        try:
+            storage.set(INDEX_KEY, encode(snapshot))
+        except Exception:
+            with self._lock:
+                self.write_errors += 1
+
+    def _select_evictions(self, index: OrderedDict) -> list[str]:
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for skey, (_, expires_at) in list(index.items()):
+                if expires_at <= now:
+                    del index[skey]
+                    evicted.append(skey)
+            total = sum(size for size, _ in index.values())
+            while total > self.max_bytes and index:
+                skey, (size, _) = index.popitem(last=False)
+                total -= size
+                evicted.append(skey)
+            self.evictions += len(evicted)
+        return evicted
+
+
+persistent_cache = PersistentCache(STORAGE_BUDGET_BYTES)
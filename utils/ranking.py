@@ -0,0 +1,188 @@
+import math
+from collections import Counter
+from datetime import date
+from typing import Optional
+
+from utils.similarity import STOPWORDS, normalize_title
+
+
+# Title terms count this many times over abstract terms
+TITLE_WEIGHT = 2
+RECENCY_HALF_LIFE_YEARS = 5.0
+
+
+def _term(token: str) -> Optional[str]:
+    if token in STOPWORDS or len(token) < 2:
+        return None
+    # Light plural strip, so "networks" and "network" match
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def term_counts(text: str) -> Counter:
+    """
+    Term frequencies of the content words in text. Tokens are counted
+    first, so each distinct word is normalized once.
+    """
+    counts: Counter = Counter()
+    for token, count in Counter(normalize_title(text).split()).items():
+        term = _term(token)
+        if term:
+            counts[term] += count
+    return counts
+
+
+class BM25:
+    """
+    Okapi BM25 over a small candidate pool. Documents are sparse
+    term-frequency vectors (Counters) indexed by term, so scoring a query
+    only touches the postings of its terms.
+    """
+
+    def __init__(self, documents: list[Counter], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lengths = [sum(doc.values()) for doc in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0.0
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        for index, doc in enumerate(documents):
+            for term, count in doc.items():
+                self.postings.setdefault(term, []).append((index, count))
+
+    def idf(self, term: str) -> float:
+        n = len(self.lengths)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: Counter) -> list[float]:
+        scores = [0.0] * len(self.lengths)
+        if not self.average_length:
+            return scores
+        for term, query_count in query.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            weight = self.idf(term) * query_count
+            for index, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / self.average_length)
+                scores[index] += weight * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+def paper_terms(paper: dict) -> Counter:
+    counts = term_counts(paper.get("abstract") or "")
+    for term, count in term_counts(paper.get("title") or "").items():
+        counts[term] += count * TITLE_WEIGHT
+    return counts
+
+
+def citation_prior(citations: Optional[int], max_citations: int) -> float:
+    if not citations or max_citations <= 0:
+        return 0.0
+    return math.log1p(citations) / math.log1p(max_citations)
+
+
+def recency_prior(year: Optional[int], current_year: int) -> float:
+    if not year:
+        return 0.0
+    age = max(current_year - int(year), 0)
+    return 0.5 ** (age / RECENCY_HALF_LIFE_YEARS)
+
+
+def rerank(
+    query: str,
+    papers: list[dict],
+    top_k: int,
+    citation_weight: float = 0.0,
+    recency_weight: float = 0.0,
+) -> list[tuple[float, dict]]:
+    """
+    Score papers (title + abstract) against query with BM25, blend in the
+    optional log-citation and recency priors, and return the top_k as
+    (score, paper), best first. Scores are in [0, 1]; the BM25 part is
+    normalized by the best match in the pool. Ties keep upstream order.
+    """
+    if not papers:
+        return []
+    citation_weight = min(max(citation_weight, 0.0), 1.0)
+    recency_weight = min(max(recency_weight, 0.0), 1.0 - citation_weight)
+    text_weight = 1.0 - citation_weight - recency_weight
+
+    relevance = BM25([paper_terms(p) for p in papers]).scores(term_counts(query))
+    best = max(relevance) or 1.0
+    max_citations = max((p.get("citationCount") or 0) for p in papers)
+    current_year = date.today().year
+
+    scored = []
+    for position, (paper, score) in enumerate(zip(papers, relevance)):
+        blended = text_weight * score / best
+        if citation_weight:
+            blended += citation_weight * citation_prior(paper.get("citationCount"), max_citations)
+        if recency_weight:
+            blended += recency_weight * recency_prior(paper.get("year"), current_year)
+        scored.append((blended, -position, paper))
+    scored.sort(key=lambda item: item[:2], reverse=True)
+    return [(score, paper) for score, _, paper in scored[:top_k]]
+
+
+# Reciprocal rank fusion constant; 60 is the usual choice and keeps one
+# list's top hit from swamping papers that several lists agree on
+RRF_K = 60
+
+
+class FusedPaper:
+    """
+    One paper in a fused ranking, with the (list index, 1-based rank) of
+    every list it appeared in. paper_id is the first paperId seen for it.
+    """
+
+    __slots__ = ("paper", "paper_id", "score", "matches")
+
+    def __init__(self, paper: dict):
+        self.paper = paper
+        self.paper_id: Optional[str] = paper.get("paperId") or None
+        self.score = 0.0
+        self.matches: list[tuple[int, int]] = []
+
+
+def fuse_rankings(rankings: list[Optional[list[dict]]], k: int = RRF_K) -> list[FusedPaper]:
+    """
+    Merge ranked paper lists with reciprocal rank fusion (sum of
+    1 / (k + rank)). Papers are deduplicated by paperId, falling back to
+    the normalized title, through two hash indexes, so the merge is linear
+    in the total number of results. The title only joins papers when one
+    side has no paperId; two different paperIds are never merged. A None
+    list (failed query) is skipped. Ties keep the order in which papers
+    were first seen.
+    """
+    by_id: dict[str, FusedPaper] = {}
+    by_title: dict[str, FusedPaper] = {}
+    fused: list[FusedPaper] = []
+    for list_index, papers in enumerate(rankings):
+        for rank, paper in enumerate(papers or (), 1):
+            paper_id = paper.get("paperId")
+            title = normalize_title(paper.get("title") or "")
+            entry = by_id.get(paper_id) if paper_id else None
+            if entry is None and title:
+                entry = by_title.get(title)
+                if entry is not None and paper_id and entry.paper_id and entry.paper_id != paper_id:
+                    # Same title, different papers
+                    entry = None
+            if entry is None:
+                entry = FusedPaper(paper)
+                fused.append(entry)
+            elif entry.matches and entry.matches[-1][0] == list_index:
+                # The same paper twice in one list counts once, at its best rank
+                continue
+            if paper_id:
+                by_id.setdefault(paper_id, entry)
+                if entry.paper_id is None:
+                    entry.paper_id = paper_id
+            if title:
+                by_title.setdefault(title, entry)
+            entry.score += 1.0 / (k + rank)
+            entry.matches.append((list_index, rank))
+    # sort is stable, so equal scores keep first-seen order
+    fused.sort(key=lambda entry: entry.score, reverse=True)
+    return fused
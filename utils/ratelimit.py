@@ -0,0 +1,147 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+
+
+RATE_LIMIT = float(os.environ.get("AI4S_RATE_LIMIT", "10"))
+RATE_BURST = float(os.environ.get("AI4S_RATE_BURST", "10"))
+MIN_RATE = 0.5
+
+MAX_RETRIES = int(os.environ.get("AI4S_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Raised when waiting for the rate limiter would overrun the call deadline
+    """
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide token bucket with AIMD adaptation: every 429 halves the
+    refill rate and pauses the bucket for Retry-After, every success adds
+    the rate back in small steps up to the configured ceiling.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float = MIN_RATE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+    def _take(self, waited: float) -> float:
+        """
+        Take a token if one is available and return 0, otherwise return the
+        seconds until one will be
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if now >= self._paused_until and self._tokens >= 1:
+                self._tokens -= 1
+                self.acquired += 1
+                self.wait_seconds += waited
+                return 0.0
+            return max(self._paused_until - now, (1 - self._tokens) / self.rate, 1e-4)
+
+    def _check_deadline(self, delay: float, waited: float, deadline: Optional[float]) -> None:
+        if deadline is not None and time.monotonic() + delay > deadline:
+            with self._lock:
+                self.wait_seconds += waited
+            raise DeadlineExceeded("Rate limit wait exceeds request deadline")
+
+    def acquire(self, deadline: Optional[float] = None) -> float:
+        """
+        Take one token, sleeping as needed. Returns seconds waited.
+        """
+        waited = 0.0
+        while True:
+            delay = self._take(waited)
+            if not delay:
+                return waited
+            self._check_deadline(delay, waited, deadline)
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, deadline: Optional[float] = None) -> float:
+        """
+        acquire() for coroutines: waits without blocking the event loop
+        """
+        waited = 0.0
+        while True:
+            delay = self._take(waited)
+            if not delay:
+                return waited
+            self._check_deadline(delay, waited, deadline)
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "max_rate": self.max_rate,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "wait_seconds": self.wait_seconds,
+            }
+
+
+rate_limiter = AdaptiveRateLimiter(RATE_LIMIT, RATE_BURST)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After is either delta-seconds or an HTTP-date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
@@ -0,0 +1,68 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, Optional
+
+
+REVALIDATE_WORKERS = int(os.environ.get("AI4S_REVALIDATE_WORKERS", "2"))
+
+
+class Revalidator:
+    """
+    Runs background refreshes for cache entries served stale. At most one
+    refresh per key is queued or running; the rest are dropped. Refreshes
+    run in an empty context, so they are neither charged to the invocation
+    that triggered them (budget) nor attributed to it (metrics).
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: set[Hashable] = set()
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.refreshed = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, refresh: Callable[[], bool]) -> None:
+        """
+        Schedule refresh() unless one is already pending for key. refresh
+        returns True when it stored a fresh entry.
+        """
+        if self.max_workers <= 0:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            self.scheduled += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ai4s-revalidate")
+            executor = self._executor
+        executor.submit(contextvars.Context().run, self._run, key, refresh)
+
+    def _run(self, key: Hashable, refresh: Callable[[], bool]) -> None:
+        try:
+            ok = refresh()
+        except Exception:
+            ok = False
+        with self._lock:
+            self._pending.discard(key)
+            if ok:
+                self.refreshed += 1
+            else:
+                # The stale entry stays in place and keeps being served
+                self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "scheduled": self.scheduled,
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "pending": len(self._pending),
+            }
+
+
+revalidator = Revalidator(REVALIDATE_WORKERS)
@@ -0,0 +1,112 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Optional
+
+
+# Words too common in titles to tell two papers apart
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "in", "into", "is",
+    "of", "on", "or", "the", "to", "via", "with",
+})
+
+
+# ASCII punctuation to spaces; same result as the \W regex on ASCII input
+_ASCII_PUNCTUATION = str.maketrans({
+    chr(c): " " for c in range(128) if not (chr(c).isalnum() or chr(c) == "_")
+})
+
+
+def normalize_title(text: str) -> str:
+    """
+    Lowercase, strip accents and punctuation, and collapse whitespace
+    """
+    text = text or ""
+    # Accent stripping and the Unicode-aware regex walk every character;
+    # plain ASCII text (most titles and abstracts) takes a translate table
+    if text.isascii():
+        return " ".join(text.lower().translate(_ASCII_PUNCTUATION).split())
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def title_tokens(normalized: str) -> frozenset:
+    tokens = normalized.split()
+    content = frozenset(t for t in tokens if t not in STOPWORDS)
+    return content or frozenset(tokens)
+
+
+def char_ngrams(normalized: str, n: int = 3) -> frozenset:
+    text = f" {normalized} "
+    if len(text) <= n:
+        return frozenset({text})
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def edit_ratio(a: str, b: str) -> float:
+    """
+    difflib ratio, skipping the full comparison when the cheap upper
+    bounds already rule out a close match
+    """
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < 0.5 or matcher.quick_ratio() < 0.5:
+        return matcher.quick_ratio()
+    return matcher.ratio()
+
+
+class TitleMatcher:
+    """
+    Scores candidate titles against one query title in [0, 1]. The query is
+    normalized once; each candidate costs a tokenization, a trigram set and
+    at most one edit-distance ratio.
+    """
+
+    def __init__(self, title: str, year: Optional[int] = None):
+        self.normalized = normalize_title(title)
+        self.tokens = title_tokens(self.normalized)
+        self.ngrams = char_ngrams(self.normalized)
+        self.year = year
+
+    def similarity(self, candidate: str) -> float:
+        normalized = normalize_title(candidate)
+        if not normalized or not self.normalized:
+            return 0.0
+        if normalized == self.normalized:
+            return 1.0
+        return (
+            0.4 * jaccard(self.tokens, title_tokens(normalized))
+            + 0.3 * jaccard(self.ngrams, char_ngrams(normalized))
+            + 0.3 * edit_ratio(self.normalized, normalized)
+        )
+
+    def year_adjustment(self, year: Optional[int]) -> float:
+        """
+        Small boost for the requested year and its neighbours (preprint vs.
+        publication year), small penalty further away
+        """
+        if self.year is None or year is None:
+            return 0.0
+        distance = abs(int(year) - self.year)
+        if distance == 0:
+            return 0.05
+        if distance == 1:
+            return 0.02
+        return -0.02 * min(distance, 5)
+
+    def score(self, candidate: str, year: Optional[int] = None) -> float:
+        return min(max(self.similarity(candidate) + self.year_adjustment(year), 0.0), 1.0)
+
+
+def confidence_label(score: float) -> str:
+    if score >= 0.9:
+        return "high"
+    if score >= 0.7:
+        return "medium"
+    return "low"
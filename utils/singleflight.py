@@ -0,0 +1,79 @@
+import threading
+from typing import Any, Callable, Hashable
+
+import requests
+
+from utils.budget import BudgetExhausted, current_budget
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        # False when the error came from the leader's own invocation budget
+        self.shared = True
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, later callers wait for it and receive the same result (or
+    exception) instead of issuing their own request.
+
+    Budgets stay per invocation: a follower waits no longer than its own
+    deadline, and when the leader failed because its budget ran out (or its
+    deadline cut a request short) the follower runs the call itself.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.executed += 1
+                    break
+                self.coalesced += 1
+
+            budget = current_budget()
+            remaining = budget.remaining() if budget is not None else None
+            if remaining is None:
+                call.done.wait()
+            elif not call.done.wait(max(remaining, 0.0)):
+                raise budget.exhausted("deadline")
+            if call.error is None:
+                return call.result
+            if call.shared:
+                raise call.error
+
+        budget = current_budget()
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            call.shared = not (
+                isinstance(e, BudgetExhausted)
+                or (isinstance(e, requests.exceptions.Timeout) and budget is not None and budget.deadline is not None)
+            )
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }